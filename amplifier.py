@@ -1,89 +1,150 @@
 #!/usr/bin/env python
 
-from itertools import permutations
-import asyncio
+from collections import deque
 import fileinput
-import os
 
 from intcode import IntCodeComputer
 
-DEBUG = 'DEBUG' in os.environ and os.environ['DEBUG']
-
-output_value = None
-
 
 def main():
     opcodes = fileinput.input().readline().strip().split(',')
-    
-    loop = asyncio.get_event_loop()
 
-    results = []
+    # Permutations sharing a prefix share the work of running it.
+    search = PhaseSearch(opcodes, range(5, 10))
+    for _ in search.run():
+        pass
 
-    for phase_settings in permutations(range(5, 10)):
-        amp = AmplificationCircuit(opcodes, phase_settings)
-        value = loop.run_until_complete(amp.run())
-        results.append(value)
-    
-    loop.close()
-    print(max(results))
+    print(search.best)
 
 
 class AmplificationCircuit:
-    def __init__(self, opcodes, phase_settings):
-        self.pipes = {0: None, 1: None, 2: None, 3: None, 4: None}
-        self.input_numbers = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0}
+    def __init__(self, opcodes, phase_settings, feedback=True,
+                 initial_signal=0, **options):
         self.phase_settings = phase_settings
-        self.amplifiers = [
-            IntCodeComputer(opcodes, self.recv_from_pipe(0),
-                            self.send_to_pipe(1)),
-            IntCodeComputer(opcodes, self.recv_from_pipe(1),
-                            self.send_to_pipe(2)),
-            IntCodeComputer(opcodes, self.recv_from_pipe(2),
-                            self.send_to_pipe(3)),
-            IntCodeComputer(opcodes, self.recv_from_pipe(3),
-                            self.send_to_pipe(4)),
-            IntCodeComputer(opcodes, self.recv_from_pipe(4),
-                            self.send_to_pipe(0))
-        ]
-
-    def recv_from_pipe(self, pipe_index):
-        async def closure():
-            # Receive phase setting first
-            if self.input_numbers[pipe_index] == 0:
-                self.input_numbers[pipe_index] += 1
-                value = self.phase_settings[pipe_index]
-                if DEBUG:
-                    print(f'received {value} from pipe {pipe_index}')
-                return value
-            # If this is the first pipe, we need to receive 0 after the phase setting
-            elif pipe_index == 0 and self.input_numbers[pipe_index] == 1:
-                self.input_numbers[pipe_index] += 1
-                if DEBUG:
-                    print(f'received 0 from pipe {pipe_index}')
-                return 0
-            # Otherwise, receive input from pipe
-            else:
-                if DEBUG:
-                    print(f'waiting for data on pipe {pipe_index}...')
-                while self.pipes[pipe_index] is None:
-                    await asyncio.sleep(0)
-                value = self.pipes[pipe_index]
-                if DEBUG:
-                    print(f'received {value} from pipe {pipe_index}')
-                self.pipes[pipe_index] = None
-                return value
-        return closure
-
-    def send_to_pipe(self, pipe_index):
-        def closure(value):
-            if DEBUG:
-                print(f'placing {value} on pipe {pipe_index}')
-            self.pipes[pipe_index] = value
-        return closure
-
-    async def run(self):
-        await asyncio.gather(*[amplifier.run() for amplifier in self.amplifiers])
-        return self.pipes[0]
+        self.feedback = feedback
+        # pipes[i] is amplifier i's input queue. Each amplifier reads
+        # straight from it and blocks when it is empty.
+        self.pipes = [deque([phase_setting])
+                      for phase_setting in phase_settings]
+        self.pipes[0].append(initial_signal)
+        self.amplifiers = [IntCodeComputer(opcodes, pipe, **options)
+                           for pipe in self.pipes]
+        self.outputs = []
+        self.signal = None
+
+    @classmethod
+    def resume(cls, amplifiers, signals, phase_settings=None, feedback=True):
+        # Build a circuit around amplifiers that are already running, with
+        # signals waiting on the first pipe. The amplifiers are forked, so
+        # the originals can be resumed again.
+        circuit = cls.__new__(cls)
+        circuit.phase_settings = phase_settings
+        circuit.feedback = feedback
+        circuit.pipes = [deque() for _ in amplifiers]
+        circuit.pipes[0].extend(signals)
+        circuit.amplifiers = [amplifier.fork(inp=pipe)
+                              for amplifier, pipe in zip(amplifiers,
+                                                         circuit.pipes)]
+        circuit.outputs = []
+        circuit.signal = signals[-1] if signals else None
+        return circuit
+
+    def run(self):
+        # Only amplifiers that have been sent something since they last
+        # blocked are run again, so waiting costs nothing.
+        runnable = deque(range(len(self.amplifiers)))
+        scheduled = set(runnable)
+
+        while runnable:
+            index = runnable.popleft()
+            scheduled.discard(index)
+            outputs = self.amplifiers[index].run_until_input()
+            if not outputs:
+                continue
+
+            target = index + 1
+            if target == len(self.amplifiers):
+                self.signal = outputs[-1]
+                if not self.feedback:
+                    self.outputs.extend(outputs)
+                    continue
+                target = 0
+
+            self.pipes[target].extend(outputs)
+            if target not in scheduled and not self.amplifiers[target].halted:
+                runnable.append(target)
+                scheduled.add(target)
+
+        return self.signal
+
+
+class PhaseSearch:
+    # Searches phase settings over the permutation tree. An amplifier's state
+    # after reading its phase setting depends on nothing else, so that state
+    # is computed once per phase. Its first pass depends only on the
+    # settings before it, so it is computed once per prefix and forked for
+    # every branch below.
+    def __init__(self, opcodes, phases, stages=None, feedback=True,
+                 initial_signal=0, **options):
+        self.phases = list(phases)
+        self.stages = stages or len(self.phases)
+        self.feedback = feedback
+        self.initial_signal = initial_signal
+        self.best = None
+        self.best_settings = None
+        self.evaluated = 0
+        self.instructions = 0
+
+        template = IntCodeComputer(opcodes, **options)
+        self._primed = {}
+        for phase in self.phases:
+            amplifier = template.fork()
+            amplifier.feed(phase)
+            self._primed[phase] = amplifier, self._execute(amplifier)
+
+    def run(self):
+        # Yields (phase settings, signal, best so far) for every permutation
+        # as it is evaluated.
+        yield from self._search((), [self.initial_signal], [])
+
+    def _search(self, settings, signals, path):
+        if len(settings) == self.stages:
+            value = self._finish(settings, signals, path)
+            self.evaluated += 1
+            if value is not None and (self.best is None or value > self.best):
+                self.best = value
+                self.best_settings = settings
+            yield settings, value, self.best
+            return
+
+        for phase in self.phases:
+            if phase in settings:
+                continue
+            primed, outputs = self._primed[phase]
+            amplifier = primed.fork()
+            amplifier.feed(*signals)
+            outputs = outputs + self._execute(amplifier)
+            yield from self._search(settings + (phase,), outputs,
+                                    path + [amplifier])
+
+    def _finish(self, settings, signals, path):
+        if not self.feedback:
+            return signals[-1] if signals else None
+
+        circuit = AmplificationCircuit.resume(path, signals, settings)
+        counts = [amplifier.instruction_count
+                  for amplifier in circuit.amplifiers]
+        value = circuit.run()
+        self.instructions += sum(amplifier.instruction_count - count
+                                 for amplifier, count in zip(circuit.amplifiers,
+                                                             counts))
+        return value
+
+    def _execute(self, amplifier):
+        count = amplifier.instruction_count
+        outputs = amplifier.run_until_input()
+        self.instructions += amplifier.instruction_count - count
+        return outputs
 
 
 if __name__ == '__main__':
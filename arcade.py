@@ -19,11 +19,10 @@ def main(stdscr):
 class ArcadeCabinet():
     def __init__(self, memory, screen):
         self.screen = screen
-        memory[0] = str(2)
+        memory[0] = 2
         self.computer = IntCodeComputer(
-            memory, self.get_input, self.get_output)
+            memory, self.get_input, self.get_output, frame_size=3)
         self.virtual_screen = defaultdict(lambda: 0)
-        self.output = []
         self.ball_x = 0
         self.paddle_x = 0
 
@@ -35,15 +34,8 @@ class ArcadeCabinet():
 
         return 0
 
-    def get_output(self, value):
-        self.output.append(value)
-
-        if len(self.output) != 3:
-            return
-
-        x = int(self.output.pop(0))
-        y = int(self.output.pop(0))
-        tile_id = int(self.output.pop(0))
+    def get_output(self, frame):
+        x, y, tile_id = frame
 
         if x == -1 and y == 0:
             self.screen.addstr(0, 0, str(tile_id))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import fileinput
+import os
+
+from intcode import IntCodeComputer
+
+
+def main():
+    lines = list(fileinput.input())
+    program = lines[0].strip().split(',')
+    jobs = [tuple(int(value) for value in line.strip().split(','))
+            for line in lines[1:] if line.strip()]
+
+    with BatchRunner(program) as runner:
+        for inputs, outputs in runner.results(run_program, jobs):
+            print(inputs, outputs)
+
+
+def run_program(program, inputs):
+    computer = IntCodeComputer(program)
+    computer.feed(*inputs)
+    return computer.run_until_input()
+
+
+# Set in each worker process by _attach().
+_program = None
+
+
+def _attach(name, length, program):
+    global _program
+    if program is not None:
+        _program = program
+        return
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        image = array('q')
+        image.frombytes(memory.buf[:length * 8])
+        _program = image.tolist()
+    finally:
+        memory.close()
+
+
+def _run_job(function, job):
+    return function(_program, job)
+
+
+class BatchRunner:
+    def __init__(self, program, processes=None, window=None):
+        program = [int(value) for value in program]
+        self.processes = processes or os.cpu_count() or 1
+        # How many jobs may be queued or running at once, so a huge job list
+        # never sits in the pool all at the same time.
+        self.window = window or self.processes * 4
+        self._memory = None
+        self._pending = set()
+
+        try:
+            image = array('q', program)
+        except OverflowError:
+            # Too big for a shared int64 array; each worker gets its own copy
+            # once, when it starts.
+            initargs = (None, len(program), program)
+        else:
+            self._memory = shared_memory.SharedMemory(
+                create=True, size=max(len(image) * 8, 1))
+            self._memory.buf[:len(image) * 8] = image.tobytes()
+            initargs = (self._memory.name, len(program), None)
+
+        self._executor = ProcessPoolExecutor(self.processes,
+                                             initializer=_attach,
+                                             initargs=initargs)
+
+    def results(self, function, jobs):
+        # Yields (job, result) pairs in completion order. Closing the
+        # generator early, e.g. by breaking out of the loop once a search has
+        # its answer, cancels every job that has not started.
+        jobs = iter(jobs)
+        submitted = {}
+
+        try:
+            while True:
+                while len(submitted) < self.window:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    future = self._executor.submit(_run_job, function, job)
+                    submitted[future] = job
+                    self._pending.add(future)
+
+                if not submitted:
+                    return
+
+                done, _ = wait(submitted, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = submitted.pop(future)
+                    self._pending.discard(future)
+                    yield job, future.result()
+        finally:
+            for future in submitted:
+                future.cancel()
+                self._pending.discard(future)
+
+    def map(self, function, jobs):
+        # (job, result) pairs in completion order; a job listed twice gets
+        # a result each time.
+        return list(self.results(function, jobs))
+
+    def cancel(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def close(self):
+        self.cancel()
+        self._executor.shutdown(cancel_futures=True)
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+from itertools import permutations
+from multiprocessing import get_context
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import os
+import resource
+
+from amplifier import AmplificationCircuit
+from arcade import ArcadeCabinet
+from droid import Droid
+from intcode import IntCodeComputer, OutputBuffer
+
+# Day 7's published feedback-loop example; its best phase setting
+# (9, 8, 7, 6, 5) gives 139629729.
+FEEDBACK_PROGRAM = [3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27,
+                    26, 27, 4, 27, 1001, 28, -1, 28, 1005, 28, 6, 99, 0, 0, 5]
+
+ENGINES = ('run', 'sync', 'jit')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Intcode interpreter.')
+    parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                        help='workload to run (default: all)')
+    parser.add_argument('--engine', action='append', choices=ENGINES,
+                        help='engine to run each workload on (default: all)')
+    parser.add_argument('--amplifier', metavar='FILE',
+                        help='amplifier program (default: day 7 example)')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare against results saved with --output')
+    args = parser.parse_args()
+
+    options = {}
+    if args.amplifier:
+        with open(args.amplifier) as f:
+            options['amplifier'] = f.readline().strip().split(',')
+
+    results = []
+    for workload in args.workload or WORKLOADS:
+        _, engines = WORKLOADS[workload]
+        for engine in args.engine or ENGINES:
+            if engine not in engines:
+                continue
+            result = measure(workload, engine, options)
+            results.append(result)
+            print(format_result(result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+def measure(workload, engine, options):
+    # Each run gets a fresh process so peak memory belongs to this workload
+    # alone.
+    with get_context('fork').Pool(1) as pool:
+        return pool.apply(run_workload, (workload, engine, options))
+
+
+def run_workload(workload, engine, options):
+    started = perf_counter()
+    function, _ = WORKLOADS[workload]
+    instructions, answer = function(engine, options)
+    wall_time = perf_counter() - started
+
+    return {
+        'workload': workload,
+        'engine': engine,
+        'instructions': instructions,
+        'wall_time': wall_time,
+        'instructions_per_second': instructions / wall_time if wall_time else 0,
+        'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'answer': answer
+    }
+
+
+def format_result(result):
+    return (f"{result['workload']:<14} {result['engine']:<5} "
+            f"{result['instructions']:>10} instructions "
+            f"{result['wall_time']:>8.3f}s "
+            f"{result['instructions_per_second']:>12,.0f}/s "
+            f"{result['peak_memory_kb']:>8} KiB")
+
+
+def compare(baseline, results):
+    baseline = {(result['workload'], result['engine']): result
+                for result in baseline}
+
+    for result in results:
+        key = result['workload'], result['engine']
+        if key not in baseline:
+            continue
+        before = baseline[key]['wall_time']
+        after = result['wall_time']
+        change = (after - before) / before * 100 if before else 0
+        print(f'{key[0]:<14} {key[1]:<5} {before:>8.3f}s -> {after:>8.3f}s '
+              f'({change:+.1f}%)')
+
+
+def execute(computer, engine):
+    if engine == 'run':
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(computer.run())
+        finally:
+            loop.close()
+    else:
+        computer.jit = engine == 'jit'
+        computer.run_sync()
+
+
+def droid_workload(engine, options):
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        droid = Droid()
+    finally:
+        os.chdir(cwd)
+
+    try:
+        execute(droid.computer, engine)
+    except asyncio.CancelledError:
+        pass
+
+    return droid.computer.instruction_count, droid.num_commands
+
+
+def amplifier_workload(engine, options):
+    program = options.get('amplifier', FEEDBACK_PROGRAM)
+    instructions = 0
+    best = None
+
+    for phase_settings in permutations(range(5, 10)):
+        circuit = AmplificationCircuit(program, phase_settings,
+                                       jit=engine == 'jit')
+        value = circuit.run()
+        instructions += sum(amplifier.instruction_count
+                            for amplifier in circuit.amplifiers)
+        best = value if best is None else max(best, value)
+
+    return instructions, best
+
+
+class NullScreen:
+    def addstr(self, *args):
+        pass
+
+    def addch(self, *args):
+        pass
+
+    def refresh(self):
+        pass
+
+
+def arcade_workload(engine, options):
+    arcade = ArcadeCabinet(arcade_program(), NullScreen())
+    execute(arcade.computer, engine)
+    return arcade.computer.instruction_count, len(arcade.virtual_screen)
+
+
+def arithmetic_workload(engine, options):
+    return run_program(arithmetic_program(), engine)
+
+
+def recursion_workload(engine, options):
+    return run_program(recursion_program(), engine)
+
+
+def high_memory_workload(engine, options):
+    return run_program(high_memory_program(), engine)
+
+
+def run_program(program, engine):
+    outputs = OutputBuffer()
+    computer = IntCodeComputer(program, None, outputs)
+    execute(computer, engine)
+    return computer.instruction_count, outputs.values[-1]
+
+
+def arithmetic_program(iterations=200_000):
+    return assemble(
+        'loop',
+        ('add', ('@', 'acc'), 7, ('@', 'acc')),
+        ('mul', ('@', 'acc'), 3, ('@', 'tmp')),
+        ('lt', ('@', 'tmp'), ('@', 'acc'), ('@', 'flag')),
+        ('add', ('@', 'count'), -1, ('@', 'count')),
+        ('jnz', ('@', 'count'), 'loop'),
+        ('out', ('@', 'acc')),
+        ('halt',),
+        'acc', ('data', 0),
+        'tmp', ('data', 0),
+        'flag', ('data', 0),
+        'count', ('data', iterations))
+
+
+def recursion_program(depth=20_000):
+    # sum(n) = n + sum(n - 1), one stack frame per call: rb+0 holds n,
+    # rb+1 the return address and rb+2 the result.
+    return assemble(
+        ('arb', 'stack'),
+        ('add', depth, 0, ('rb', 0)),
+        ('add', 'done', 0, ('rb', 1)),
+        ('jz', 0, 'sum'),
+        'done',
+        ('out', ('rb', 2)),
+        ('halt',),
+        'sum',
+        ('jz', ('rb', 0), 'base'),
+        ('add', ('rb', 0), -1, ('rb', 3)),
+        ('add', 'return', 0, ('rb', 4)),
+        ('arb', 3),
+        ('jz', 0, 'sum'),
+        'return',
+        ('arb', -3),
+        ('add', ('rb', 0), ('rb', 5), ('rb', 2)),
+        ('jz', 0, ('rb', 1)),
+        'base',
+        ('add', 0, 0, ('rb', 2)),
+        ('jz', 0, ('rb', 1)),
+        'stack')
+
+
+def high_memory_program(accesses=5_000, stride=1_000_003):
+    return assemble(
+        'loop',
+        ('arb', stride),
+        ('add', ('@', 'count'), 0, ('rb', 0)),
+        ('add', ('rb', 0), ('@', 'sum'), ('@', 'sum')),
+        ('add', ('@', 'count'), -1, ('@', 'count')),
+        ('jnz', ('@', 'count'), 'loop'),
+        ('out', ('@', 'sum')),
+        ('halt',),
+        'sum', ('data', 0),
+        'count', ('data', accesses))
+
+
+def arcade_program(width=40, height=20, rounds=2_000):
+    # Draws a full screen of blocks, then plays a round per joystick input:
+    # move the paddle, move the ball and report the score. ArcadeCabinet
+    # overwrites address 0 with 2, which turns the first add into a
+    # harmless multiply.
+    return assemble(
+        ('add', ('@', 'scratch'), ('@', 'scratch'), ('@', 'scratch')),
+        'row',
+        ('add', 0, 0, ('@', 'x')),
+        'cell',
+        ('out', ('@', 'x')),
+        ('out', ('@', 'y')),
+        ('out', 2),
+        ('add', ('@', 'x'), 1, ('@', 'x')),
+        ('lt', ('@', 'x'), width, ('@', 'flag')),
+        ('jnz', ('@', 'flag'), 'cell'),
+        ('add', ('@', 'y'), 1, ('@', 'y')),
+        ('lt', ('@', 'y'), height, ('@', 'flag')),
+        ('jnz', ('@', 'flag'), 'row'),
+        'game',
+        ('in', ('@', 'joystick')),
+        ('add', ('@', 'paddle'), ('@', 'joystick'), ('@', 'paddle')),
+        ('out', ('@', 'paddle')),
+        ('out', height),
+        ('out', 3),
+        ('add', ('@', 'ball'), 1, ('@', 'ball')),
+        ('lt', ('@', 'ball'), width, ('@', 'flag')),
+        ('jnz', ('@', 'flag'), 'draw'),
+        ('add', 0, 0, ('@', 'ball')),
+        'draw',
+        ('out', ('@', 'ball')),
+        ('out', height - 1),
+        ('out', 4),
+        ('out', -1),
+        ('out', 0),
+        ('out', ('@', 'rounds')),
+        ('add', ('@', 'rounds'), -1, ('@', 'rounds')),
+        ('jnz', ('@', 'rounds'), 'game'),
+        ('halt',),
+        'scratch', ('data', 0),
+        'x', ('data', 0),
+        'y', ('data', 0),
+        'flag', ('data', 0),
+        'joystick', ('data', 0),
+        'paddle', ('data', width // 2),
+        'ball', ('data', 0),
+        'rounds', ('data', rounds))
+
+
+def assemble(*lines):
+    # Tiny assembler for the synthetic programs. A line is a label string,
+    # ('data', values...) or an instruction name followed by its operands.
+    # Operands are ints (immediate), ('@', address) for position mode or
+    # ('rb', offset) for relative mode; a label may stand in for any int.
+    opcodes = {'add': 1, 'mul': 2, 'in': 3, 'out': 4, 'jnz': 5, 'jz': 6,
+               'lt': 7, 'eq': 8, 'arb': 9, 'halt': 99}
+    labels = {}
+    address = 0
+    for line in lines:
+        if isinstance(line, str):
+            labels[line] = address
+        else:
+            address += len(line) - 1 if line[0] == 'data' else len(line)
+
+    def resolve(value):
+        return labels[value] if isinstance(value, str) else value
+
+    program = []
+    for line in lines:
+        if isinstance(line, str):
+            continue
+        name, *operands = line
+        if name == 'data':
+            program.extend(operands)
+            continue
+
+        opcode = opcodes[name]
+        for index, operand in enumerate(operands):
+            if not isinstance(operand, tuple):
+                opcode += 10 ** (index + 2)
+            elif operand[0] == 'rb':
+                opcode += 2 * 10 ** (index + 2)
+        program.append(opcode)
+        program.extend(resolve(operand[1] if isinstance(operand, tuple)
+                               else operand)
+                       for operand in operands)
+    return program
+
+
+# Workload name -> (function, engines it can run on).
+WORKLOADS = {
+    'droid': (droid_workload, ENGINES),
+    # AmplificationCircuit schedules its amplifiers on the synchronous
+    # engine.
+    'amplifier': (amplifier_workload, ('sync', 'jit')),
+    'arcade': (arcade_workload, ENGINES),
+    'arithmetic': (arithmetic_workload, ENGINES),
+    'recursion': (recursion_workload, ENGINES),
+    'high-memory': (high_memory_workload, ENGINES)
+}
+
+
+if __name__ == '__main__':
+    main()
@@ -57,15 +57,15 @@ class Droid:
         return Droid.possible_moves[next_move]
 
     def get_output(self, value):
-        if value == '0':
+        if value == 0:
             self.map[self.current_location] = '#'
             prev_move = tuple(map(operator.mul, (-1, -1), self.moves.pop()))
             self.current_location = tuple(
                 map(operator.add, self.current_location, prev_move))
             self.num_commands -= 1
-        elif value == '1':
+        elif value == 1:
             self.map[self.current_location] = '.'
-        elif value == '2':
+        elif value == 2:
             raise asyncio.CancelledError("found!")
 
     def __repr__(self):
@@ -1,32 +1,99 @@
 #!/usr/bin/env python
 
-import fileinput
-from collections import defaultdict
+import io
+import sys
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from itertools import combinations
 
 
 def main():
-    grid = Grid((1, 1), (line.strip() for line in fileinput.input()))
+    stream = open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin
+    grid = Grid((1, 1), read_wire_specs(stream))
     # print(grid)
     # print(grid.find_shortest_taxicab_distance_to_intersection())
     print(grid.find_shortest_path_distance_to_intersection())
 
 
+def read_wire_specs(stream, chunk_size=1 << 16):
+    # Yields one lazy wire spec per line of the stream, reading it a chunk at
+    # a time. Each spec has to be used up before asking for the next one.
+    tokens = _read_tokens(stream, chunk_size)
+    for token in tokens:
+        if token is not None:
+            yield _read_wire(token, tokens)
+
+
+def _read_wire(first, tokens):
+    yield first
+    for token in tokens:
+        if token is None:
+            return
+        yield token
+
+
+def _read_tokens(stream, chunk_size):
+    # Yields the instructions in the stream, with None at the end of a line.
+    pending = ''
+    for chunk in iter(lambda: stream.read(chunk_size), ''):
+        *lines, pending = (pending + chunk).split('\n')
+        for line in lines:
+            yield from _split_instructions(line)
+            yield None
+        *instructions, pending = pending.split(',')
+        yield from _split_instructions(','.join(instructions))
+    yield from _split_instructions(pending)
+    yield None
+
+
+def _split_instructions(text):
+    for instruction in text.split(','):
+        instruction = instruction.strip()
+        if instruction:
+            yield instruction
+
+
+def instructions(wire_spec):
+    if isinstance(wire_spec, str):
+        return _split_instructions(wire_spec)
+    return wire_spec
+
+
 class Grid:
     def __init__(self, central_port, wire_specs):
-        self._grid = defaultdict(lambda: Port())
+        self._grid = {}
         self._grid[central_port] = Port(is_central=True)
         self._central_port = central_port
         self._current_loc = central_port
         self._current_wire = 0
         self._wires = set()
-        self._intersections = defaultdict(dict)
         self._current_length = 0
         self._instructions = None
         self._wire_specs = wire_specs
         self.place_wires()
 
-    def find_intersections(self):
-        return [point for point in self._grid if self._grid[point].is_intersection()]
+    def find_intersections(self, min_wires=2):
+        return [point for point in self._grid if self._grid[point].is_intersection(min_wires)]
+
+    def find_pair_intersections(self):
+        pairs = defaultdict(list)
+        for point in self.find_intersections():
+            for pair in combinations(sorted(self._grid[point].wires()), 2):
+                pairs[pair].append(point)
+        return pairs
+
+    def find_nearest_crossings(self, distance='taxicab'):
+        # Wire pair -> (distance, point) of the pair's nearest crossing.
+        nearest = {}
+        for (first, second), points in self.find_pair_intersections().items():
+            if distance == 'taxicab':
+                measured = [self.calculate_taxicab_distance_from_central_port(point) for point in points]
+            elif distance == 'path':
+                measured = [self._grid[point].length(first) + self._grid[point].length(second) for point in points]
+            else:
+                raise Exception(f'unknown distance: {distance}')
+            nearest[first, second] = min(zip(measured, points))
+        return nearest
 
     def find_shortest_taxicab_distance_to_intersection(self):
         return min([self.calculate_taxicab_distance_from_central_port(x) for x in self.find_intersections()])
@@ -35,12 +102,9 @@ class Grid:
         return abs(self._central_port[0] - point[0]) + abs(self._central_port[1] - point[1])
 
     def find_shortest_path_distance_to_intersection(self):
-        self.place_wires(follow_only=True)
-        lengths = [[self._intersections[key][point] for point in sorted(self._intersections[key].keys())]
-                   for key in self._intersections]
-        return min([sum(l) for l in zip(*lengths)])
+        return min([self._grid[point].shortest_pair_length() for point in self.find_intersections()])
 
-    def place_wires(self, follow_only=False):
+    def place_wires(self):
         dispatch_table = {
             'U': self._go_up,
             'D': self._go_down,
@@ -54,105 +118,307 @@ class Grid:
             self._current_loc = self._central_port
             self._current_wire += 1
             self._current_length = 0
-            if not follow_only:
-                self._wires.add(self._current_wire)
-            instructions = wire_spec.split(',')
-            for instruction in instructions:
+            self._wires.add(self._current_wire)
+            direction = None
+            for instruction in instructions(wire_spec):
                 dir = instruction[0]
                 spots = int(instruction[1:])
-                dispatch_table[dir](spots, follow_only)
+                direction = dispatch_table[dir](spots) or direction
+            # Every cell is placed as the wire leaves it, so the last one
+            # still needs placing.
+            if direction is not None:
+                self._place_node(self._current_loc, direction)
 
     def _place_node(self, point, direction):
-        self._grid[point].place(self._current_wire, direction)
+        port = self._grid.get(point)
+        if port is None:
+            port = self._grid[point] = Port()
+        port.place(self._current_wire, direction, self._current_length)
 
-    def _fix_grid(self):
-        xs = [x for (x, _) in self._grid]
-        ys = [y for (_, y) in self._grid]
-        for x in range(min(xs), max(xs) + 1):
-            for y in range(min(ys), max(ys) + 1):
-                self._grid[x, y]
-
-    def _go_left(self, spots, follow_only=False):
-        self._go_horizontal(-spots, follow_only)
+    def _go_left(self, spots):
+        return self._go_horizontal(-spots)
 
-    def _go_right(self, spots, follow_only=False):
-        self._go_horizontal(spots, follow_only)
+    def _go_right(self, spots):
+        return self._go_horizontal(spots)
 
-    def _go_up(self, spots, follow_only=False):
-        self._go_vertical(spots, follow_only)
+    def _go_up(self, spots):
+        return self._go_vertical(spots)
 
-    def _go_down(self, spots, follow_only=False):
-        self._go_vertical(-spots, follow_only)
+    def _go_down(self, spots):
+        return self._go_vertical(-spots)
 
-    def _go_horizontal(self, spots, follow_only=False):
+    def _go_horizontal(self, spots):
+        if not spots:
+            return None
         direction = int(spots / abs(spots))
         for _ in range(0, abs(spots)):
-            if not follow_only:
-                self._place_node(self._current_loc, 'H')
+            self._place_node(self._current_loc, 'H')
             self._current_loc = (
                 self._current_loc[0] + direction, self._current_loc[1])
             self._current_length += 1
-            if self._grid[self._current_loc].is_intersection():
-                self._intersections[self._current_wire][self._current_loc] = self._current_length
+        return 'H'
 
-    def _go_vertical(self, spots, follow_only=False):
+    def _go_vertical(self, spots):
+        if not spots:
+            return None
         direction = int(spots / abs(spots))
         for _ in range(0, abs(spots)):
-            if not follow_only:
-                self._place_node(self._current_loc, 'V')
+            self._place_node(self._current_loc, 'V')
             self._current_loc = (
                 self._current_loc[0], self._current_loc[1] + direction)
             self._current_length += 1
-            if self._grid[self._current_loc].is_intersection():
-                self._intersections[self._current_wire][self._current_loc] = self._current_length
+        return 'V'
+
+    def bounds(self):
+        xs = [x for (x, _) in self._grid]
+        ys = [y for (_, y) in self._grid]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def render(self, stream, region=None, scale=1):
+        # Writes the cells in region, an inclusive (min_x, min_y, max_x,
+        # max_y), one line at a time. With a scale above one, each character
+        # stands for a scale x scale block and shows its most notable cell.
+        min_x, min_y, max_x, max_y = region or self.bounds()
+        width = (max_x - min_x) // scale + 1
+        height = (max_y - min_y) // scale + 1
+
+        # Look up every cell of a small region; otherwise pick the region's
+        # cells out of the ports that exist.
+        if (max_x - min_x + 1) * (max_y - min_y + 1) <= len(self._grid):
+            points = ((x, y) for y in range(min_y, max_y + 1) for x in range(min_x, max_x + 1)
+                      if (x, y) in self._grid)
+        else:
+            points = (point for point in self._grid
+                      if min_x <= point[0] <= max_x and min_y <= point[1] <= max_y)
+
+        rows = defaultdict(dict)
+        for x, y in points:
+            char = str(self._grid[x, y])
+            row = rows[(y - min_y) // scale]
+            column = (x - min_x) // scale
+            if RANKS[char] > RANKS[row.get(column, EMPTY)]:
+                row[column] = char
+
+        for row_index in reversed(range(height)):
+            line = [EMPTY] * width
+            for column, char in rows.pop(row_index, {}).items():
+                line[column] = char
+            stream.write(' ' + ' '.join(line) + '\n')
 
     def __repr__(self):
-        self._fix_grid()
-        repr = ''
+        output = io.StringIO()
+        self.render(output)
+        return output.getvalue()
+
+
+CENTRAL = 1
+HORIZONTAL = 2
+VERTICAL = 4
+
+DIRECTION_FLAGS = {
+    'H': HORIZONTAL,
+    'V': VERTICAL
+}
 
-        for y in reversed(sorted(list(set([y for _, y in self._grid])))):
-            for x in sorted(list(set([x for x, _ in self._grid]))):
-                repr += ' ' + str(self._grid[x, y])
-            repr += '\n'
+EMPTY = '.'
 
-        return repr
+# Which character wins when several cells share one rendered character.
+RANKS = {EMPTY: 0, '-': 1, '|': 1, '+': 2, 'x': 3, 'o': 4}
 
 
 class Port:
+    # There is one Port per cell a wire touches, so they are kept small: the
+    # flags and the set of wires are bit sets, and the first wire's count
+    # and first-arrival length live inline. Only cells shared by several
+    # wires need a dict for the rest.
+    __slots__ = ('_flags', '_wires', '_wire', '_count', '_length', '_others')
+
     def __init__(self, is_central=False):
-        self._is_central = is_central
-        self._wires = set()
-        self._directions = set()
-        self._count = defaultdict(lambda: 0)
+        self._flags = CENTRAL if is_central else 0
+        self._wires = 0
+        self._wire = None
+        self._count = 0
+        self._length = None
+        self._others = None
 
-    def is_intersection(self):
-        return not self._is_central and len(self._wires) > 1
+    def is_intersection(self, min_wires=2):
+        return not self._flags & CENTRAL and self._wires.bit_count() >= min_wires
 
     def is_self_intersection(self, wire):
-        return self._count[wire] > 1
-
-    def place(self, wire, direction):
-        self._wires.add(wire)
-        self._count[wire] += 1
-        self._directions.update([direction])
+        return self._record(wire)[0] > 1
+
+    def place(self, wire, direction, length=0):
+        self._flags |= DIRECTION_FLAGS[direction]
+        self._wires |= 1 << wire
+        # Only the first time a wire reaches this port counts.
+        if self._wire is None or self._wire == wire:
+            self._wire = wire
+            if self._length is None:
+                self._length = length
+            self._count += 1
+        else:
+            if self._others is None:
+                self._others = {}
+            count, first = self._others.get(wire, (0, length))
+            self._others[wire] = (count + 1, first)
+
+    def _record(self, wire):
+        if wire == self._wire:
+            return self._count, self._length
+        if self._others is not None and wire in self._others:
+            return self._others[wire]
+        return 0, None
+
+    def length(self, wire):
+        return self._record(wire)[1]
+
+    def shortest_pair_length(self):
+        # The fewest combined steps of any two wires meeting here, which for
+        # two wires is simply their sum.
+        if self._wire is None:
+            return 0
+        others = self._others.values() if self._others is not None else ()
+        return sum(sorted([self._length, *(length for _, length in others)])[:2])
 
     def has_wire(self, wire):
-        return wire in self._wires
+        return bool(self._wires >> wire & 1)
+
+    def wires(self):
+        if self._wire is None:
+            return set()
+        return {self._wire, *(self._others or ())}
 
     def __repr__(self):
-        if self._is_central:
+        if self._flags & CENTRAL:
             return 'o'
         elif self.is_intersection():
             return 'x'
-        elif len(self._directions) > 0:
-            if 'H' in self._directions and 'V' in self._directions:
-                return '+'
-            elif 'H' in self._directions:
-                return '-'
-            elif 'V' in self._directions:
-                return '|'
+        elif self._flags & HORIZONTAL and self._flags & VERTICAL:
+            return '+'
+        elif self._flags & HORIZONTAL:
+            return '-'
+        elif self._flags & VERTICAL:
+            return '|'
         else:
-            return '.'
+            return EMPTY
+
+
+DIRECTIONS = {
+    'U': (0, 1),
+    'D': (0, -1),
+    'L': (-1, 0),
+    'R': (1, 0)
+}
+
+Segment = namedtuple('Segment', ['wire', 'start', 'end', 'steps'])
+
+
+class SegmentGrid:
+    # Works on each wire's straight runs instead of its cells, so the cost
+    # follows the number of segments no matter how long they are.
+    def __init__(self, central_port, wire_specs):
+        self._central_port = central_port
+        self._segments = []
+        for wire, wire_spec in enumerate(wire_specs, 1):
+            self._segments.extend(self._trace(wire, wire_spec))
+        # Candidate intersections with the combined steps of the two wires
+        # that meet there. Every optimum of either query is among them.
+        self._crossings = list(self._find_crossings())
+
+    def find_shortest_taxicab_distance_to_intersection(self):
+        return min([self.calculate_taxicab_distance_from_central_port(point)
+                    for point, _ in self._crossings])
+
+    def calculate_taxicab_distance_from_central_port(self, point):
+        return abs(self._central_port[0] - point[0]) + abs(self._central_port[1] - point[1])
+
+    def find_shortest_path_distance_to_intersection(self):
+        return min([steps for _, steps in self._crossings])
+
+    def _trace(self, wire, wire_spec):
+        x, y = self._central_port
+        steps = 0
+        for instruction in instructions(wire_spec):
+            dx, dy = DIRECTIONS[instruction[0]]
+            spots = int(instruction[1:])
+            if not spots:
+                continue
+            end = (x + dx * spots, y + dy * spots)
+            yield Segment(wire, (x, y), end, steps)
+            x, y = end
+            steps += spots
+
+    def _steps(self, segment, point):
+        return segment.steps + abs(point[0] - segment.start[0]) + abs(point[1] - segment.start[1])
+
+    def _find_crossings(self):
+        horizontal = [s for s in self._segments if s.start[1] == s.end[1]]
+        vertical = [s for s in self._segments if s.start[0] == s.end[0]]
+        yield from self._sweep(horizontal, vertical)
+        yield from self._overlaps(horizontal, 0)
+        yield from self._overlaps(vertical, 1)
+
+    def _sweep(self, horizontal, vertical):
+        # Sweep left to right keeping the horizontal segments that span the
+        # current x ordered by y; each vertical segment is a range query.
+        events = []
+        for index, segment in enumerate(horizontal):
+            lo, hi = sorted((segment.start[0], segment.end[0]))
+            events.append((lo, 0, index))
+            events.append((hi, 2, index))
+        for index, segment in enumerate(vertical):
+            events.append((segment.start[0], 1, index))
+        events.sort()
+
+        active = []
+        for x, kind, index in events:
+            if kind == 0:
+                insort(active, (horizontal[index].start[1], index))
+            elif kind == 2:
+                del active[bisect_left(active, (horizontal[index].start[1], index))]
+            else:
+                segment = vertical[index]
+                lo, hi = sorted((segment.start[1], segment.end[1]))
+                for i in range(bisect_left(active, (lo, -1)), len(active)):
+                    y, other = active[i]
+                    if y > hi:
+                        break
+                    other = horizontal[other]
+                    point = (x, y)
+                    if other.wire != segment.wire and point != self._central_port:
+                        yield point, self._steps(segment, point) + self._steps(other, point)
+
+    def _overlaps(self, segments, axis):
+        # Collinear segments of different wires share a whole run of cells.
+        # Along the run both objectives are linear or convex, so its ends
+        # and the cell nearest the central port are enough.
+        lines = defaultdict(list)
+        for segment in segments:
+            lo, hi = sorted((segment.start[axis], segment.end[axis]))
+            lines[segment.start[1 - axis]].append((lo, hi, segment))
+
+        for fixed, line in lines.items():
+            line.sort(key=lambda item: item[0])
+            active = []
+            for lo, hi, segment in line:
+                active = [item for item in active if item[1] >= lo]
+                for _, other_hi, other in active:
+                    if other.wire != segment.wire:
+                        yield from self._overlap_candidates(segment, other, axis, fixed,
+                                                            lo, min(hi, other_hi))
+                active.append((lo, hi, segment))
+
+    def _overlap_candidates(self, first, second, axis, fixed, lo, hi):
+        centre = self._central_port[axis]
+        positions = {lo, hi, min(max(centre, lo), hi)}
+        if self._central_port[1 - axis] == fixed:
+            # The central port never counts, so try its neighbours too.
+            positions.update(p for p in (centre - 1, centre + 1) if lo <= p <= hi)
+
+        for position in positions:
+            point = (position, fixed) if axis == 0 else (fixed, position)
+            if point != self._central_port:
+                yield point, self._steps(first, point) + self._steps(second, point)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,28 @@
 #!/usr/bin/env python
 
+from collections import Counter, deque, namedtuple
+from copy import copy
 from functools import partial
-from itertools import chain
+from itertools import chain, tee
+from time import perf_counter
 import asyncio
 import fileinput
-import os
+import inspect
+import sys
 
-DEBUG = 'DEBUG' in os.environ and os.environ['DEBUG']
+# Reasons the synchronous engine hands control back to its caller.
+NEEDS_INPUT = 'input'
+OUTPUT = 'output'
+HALTED = 'halted'
+SUSPENDED = 'suspended'
+
+# A jump target becomes a compiled block after being entered this many times.
+JIT_THRESHOLD = 16
+JIT_MAX_BLOCK_LENGTH = 64
+
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
 
 
 def main():
@@ -20,19 +36,193 @@ def main():
 
 def get_input():
     async def closure():
-        return input('Enter input: ')
+        return int(input('Enter input: '))
     return closure
 
 
+Instruction = namedtuple(
+    'Instruction', ['opcode', 'modes', 'operands', 'operation', 'parameters'])
+
+Snapshot = namedtuple(
+    'Snapshot', ['memory', 'pos', 'relative_base', 'pending_input', 'state'])
+
+
+class OutputBuffer:
+    def __init__(self, frame_size=1):
+        self.frame_size = frame_size
+        self.values = []
+
+    def frames(self):
+        if self.frame_size == 1:
+            return iter(self.values)
+        return zip(*[iter(self.values)] * self.frame_size)
+
+    def drain(self):
+        frames = list(self.frames())
+        del self.values[:len(frames) * self.frame_size]
+        return frames
+
+    def __len__(self):
+        return len(self.values) // self.frame_size
+
+
+class Profiler:
+    def __init__(self, trace_size=64, stream=None):
+        self.opcode_counts = Counter()
+        self.address_counts = Counter()
+        self.instructions = 0
+        self.compute_time = 0.0
+        self.input_wait_time = 0.0
+        # The last few instructions executed, as
+        # (address, opcode, modes, operands, relative base).
+        self.trace = deque(maxlen=trace_size)
+        self.stream = stream
+
+    def record(self, pos, instruction, relative_base):
+        self.instructions += 1
+        self.opcode_counts[instruction.opcode] += 1
+        self.address_counts[pos] += 1
+        self.trace.append((pos, instruction.opcode, instruction.modes,
+                           instruction.operands, relative_base))
+
+    def instructions_per_second(self):
+        if self.compute_time == 0:
+            return 0.0
+        return self.instructions / self.compute_time
+
+    def hot_spots(self, count=10):
+        return self.address_counts.most_common(count)
+
+    def report(self):
+        return {
+            'instructions': self.instructions,
+            'instructions_per_second': self.instructions_per_second(),
+            'compute_time': self.compute_time,
+            'input_wait_time': self.input_wait_time,
+            'opcode_counts': dict(self.opcode_counts),
+            'hot_spots': self.hot_spots()
+        }
+
+    def dump(self):
+        stream = self.stream or sys.stderr
+        print(f'last {len(self.trace)} instructions:', file=stream)
+        for pos, opcode, modes, operands, relative_base in self.trace:
+            print(f'  {pos:>6}: {opcode:>2} modes={modes} operands={operands} '
+                  f'relative_base={relative_base}', file=stream)
+
+
 class IntCodeComputer:
-    def __init__(self, memory, inp, outp):
-        self._memory = memory.copy()
-        self._input = inp
-        self._output = outp
+    def __init__(self, memory, inp=None, outp=None, string_output=False,
+                 jit=False, frame_size=1, profiler=None):
+        # Parse the program once; the VM works on ints from here on.
+        self._memory = PagedMemory(int(value) for value in memory)
         self._pos = 0
         self._relative_base = 0
+        self._instructions = {}
+        self._decoded_from = {}
+        self._pending_input = deque()
+        self._connect_input(inp)
+        self._connect_output(outp, string_output, frame_size)
+        self._last_output = None
+        self.state = None
+        self.instruction_count = 0
+        self.jit = jit
+        self.profiler = profiler
+        self.compiled_blocks = 0
+        self.deoptimized_blocks = 0
+        self._blocks = {}
+        self._heat = {}
+
+    def _connect_input(self, inp):
+        # Input is either a callback or a channel: a deque the caller keeps
+        # appending to, or any other iterable that is consumed lazily.
+        self._source = None
+        if inp is None or callable(inp):
+            self._input = inp
+        else:
+            if isinstance(inp, deque):
+                self._pending_input = inp
+            else:
+                self._source = iter(inp)
+            self._input = self._next_input
+
+    def _connect_output(self, outp, string_output=False, frame_size=1):
+        # Output is either a callback or an OutputBuffer the engine appends
+        # to directly.
+        self._sink = None
+        self._framer = None
+        self._string_output = string_output
+        self.output_buffer = None
+        if isinstance(outp, OutputBuffer):
+            # The engines append raw values to the buffer, which does its own
+            # framing.
+            if string_output or frame_size > 1:
+                raise Exception('string_output and frame_size do not apply to an OutputBuffer')
+            self.output_buffer = outp
+            self._sink = outp.values
+            outp = self._sink.append
+        elif outp is not None and frame_size > 1:
+            outp = self._framer = Framer(outp, frame_size)
+        # Older callers compare outputs against strings like '0' and '1'.
+        if string_output:
+            self._output = lambda value: outp(str(value))
+        else:
+            self._output = outp
+
+    async def _next_input(self):
+        if self._pending_input:
+            return self._pending_input.popleft()
+        if self._source is not None:
+            for value in self._source:
+                return value
+        raise Exception('input exhausted')
 
     async def run(self):
+        self._pos = 0
+
+        while True:
+            pos = self._pos
+            instruction = self._instructions.get(pos)
+            if instruction is None:
+                try:
+                    instruction = self.decode(pos)
+                except Exception:
+                    # Invalid opcodes get the same trace as the sync engine.
+                    if self.profiler is not None:
+                        self.profiler.dump()
+                    raise
+
+            operation = instruction.operation(instruction.parameters,
+                                              self._input,
+                                              self._output,
+                                              self.set_instruction_pointer,
+                                              self.adjust_relative_base)
+
+            if operation.should_exit:
+                break
+
+            self.instruction_count += 1
+            profiler = self.profiler
+            if profiler is None:
+                await operation.perform_operation()
+            else:
+                profiler.record(pos, instruction, self._relative_base)
+                started = perf_counter()
+                try:
+                    await operation.perform_operation()
+                except Exception:
+                    profiler.dump()
+                    raise
+                elapsed = perf_counter() - started
+                if instruction.opcode == 3:
+                    profiler.input_wait_time += elapsed
+                else:
+                    profiler.compute_time += elapsed
+
+            if not operation.modified_instruction_pointer:
+                self._pos += operation.increment_by()
+
+    def decode(self, pos):
         dispatch_table = {
             1: AddOperation,
             2: MultiplyOperation,
@@ -46,52 +236,381 @@ class IntCodeComputer:
             99: ExitOperation
         }
 
+        value = self.get_memory_at_position(pos)
+        opcode = value % 100
+
+        if opcode in dispatch_table:
+            operation = dispatch_table[opcode]
+        else:
+            raise Exception(f'invalid opcode: {opcode}')
+
+        num_parameters = operation.num_parameters()
+        operands = tuple(self.get_memory_at_position(pos + i + 1)
+                         for i in range(num_parameters))
+        modes = tuple(value // 10 ** (i + 2) % 10
+                      for i in range(num_parameters))
+        parameters = self.get_parameters(zip(operands, modes))
+
+        instruction = Instruction(
+            opcode, modes, operands, operation, parameters)
+        self._instructions[pos] = instruction
+
+        # Remember which addresses this instruction was decoded from so a
+        # write to any of them throws the cached copy away.
+        for address in range(pos, pos + num_parameters + 1):
+            self._decoded_from.setdefault(address, set()).add(pos)
+
+        return instruction
+
+    def invalidate(self, pos):
+        for start in self._decoded_from.pop(pos, ()):
+            self._instructions.pop(start, None)
+            if self._blocks.pop(start, None) is not None:
+                self.deoptimized_blocks += 1
+                self._heat[start] = 0
+
+    def _operand_source(self, mode, operand):
+        if mode == 1:
+            return str(operand)
+        if mode == 2:
+            return f'read(rb + {operand})'
+        # Constant addresses inside the program image are read straight from
+        # their page; the page list is looked up each time because a
+        # copy-on-write replaces it.
+        if 0 <= operand < self._memory._dense_count * PAGE_SIZE:
+            return f'dense[{operand >> PAGE_BITS}][{operand & PAGE_MASK}]'
+        return f'read({operand})'
+
+    def _store_source(self, address, expression):
+        if not 0 <= address < self._memory._dense_count * PAGE_SIZE:
+            return [f'        write({address}, {expression})']
+        # Shared pages and decoded code still go through write() so
+        # copy-on-write and invalidation happen as usual.
+        index = address >> PAGE_BITS
+        return [f'        value = {expression}',
+                f'        if {address} in code or (shared and {index} in shared):',
+                f'            write({address}, value)',
+                f'        else:',
+                f'            dense[{index}][{address & PAGE_MASK}] = value']
+
+    def _compile(self, start):
+        # Collect the straight-line run of instructions starting here. Input,
+        # output and halt are left to the interpreter; a jump ends the block.
+        body = []
+        pos = start
+        while len(body) < JIT_MAX_BLOCK_LENGTH:
+            try:
+                instruction = self._instructions.get(pos) or self.decode(pos)
+            except Exception:
+                break
+            if instruction.opcode in (3, 4, 99):
+                break
+            if instruction.opcode in (1, 2, 7, 8) and instruction.modes[2] == 1:
+                break
+            body.append((pos, instruction))
+            pos += len(instruction.operands) + 1
+            if instruction.opcode in (5, 6):
+                break
+
+        if not body:
+            return
+
+        end = pos
+        length = len(body)
+        lines = ['def block(read, write, dense, shared, code, blocks, rb, limit):',
+                 '    executed = 0',
+                 '    while True:']
+        for count, (pos, instruction) in enumerate(body, 1):
+            opcode, modes, operands, _, _ = instruction
+            following = pos + len(operands) + 1
+            values = [self._operand_source(mode, operand)
+                      for mode, operand in zip(modes, operands)]
+
+            if opcode in (1, 2, 7, 8):
+                expression = {
+                    1: '{} + {}',
+                    2: '{} * {}',
+                    7: '1 if {} < {} else 0',
+                    8: '1 if {} == {} else 0'
+                }[opcode].format(*values[:2])
+                if modes[2] == 0:
+                    lines.extend(self._store_source(operands[2], expression))
+                    # The block rewrites its own remaining code; hand the
+                    # rest back to the interpreter.
+                    if following <= operands[2] < end:
+                        end = following
+                        length = count
+                        lines.append(
+                            f'        return {following}, rb, executed + {count}')
+                        break
+                else:
+                    lines.append(f'        address = rb + {operands[2]}')
+                    lines.append(f'        write(address, {expression})')
+                    if following < end:
+                        lines.append(
+                            f'        if {following} <= address < {end}:')
+                        lines.append(
+                            f'            return {following}, rb, executed + {count}')
+            elif opcode == 9:
+                lines.append(f'        rb += {values[0]}')
+            else:
+                condition = '!=' if opcode == 5 else '=='
+                lines.append(f'        if {values[0]} {condition} 0:')
+                if modes[1] == 1 and operands[1] == start:
+                    # Tight loop back to the top of the block: keep going
+                    # here while the block is still valid and within budget.
+                    lines.append(f'            executed += {count}')
+                    lines.append(f'            if {start} not in blocks or '
+                                 f'0 <= limit < executed + {count}:')
+                    lines.append(f'                return {start}, rb, executed')
+                    lines.append(f'            continue')
+                else:
+                    lines.append(
+                        f'            return {values[1]}, rb, executed + {count}')
+                lines.append(f'        return {following}, rb, executed + {count}')
+                break
+        else:
+            lines.append(f'        return {end}, rb, executed + {length}')
+
+        namespace = {}
+        exec('\n'.join(lines), namespace)
+        self._blocks[start] = (namespace['block'], length)
+        self.compiled_blocks += 1
+
+        for address in range(start, end):
+            self._decoded_from.setdefault(address, set()).add(start)
+
+    def run_sync(self):
         self._pos = 0
 
         while True:
-            pos = self._pos
-            opcode = int(self._memory[pos][-2:].lstrip('0'))
-
-            if opcode in dispatch_table:
-                operation = dispatch_table[opcode]
+            state = self.state = self._execute()
+            if state == NEEDS_INPUT:
+                if self.profiler is None:
+                    self._pending_input.append(self._read_input())
+                else:
+                    started = perf_counter()
+                    self._pending_input.append(self._read_input())
+                    self.profiler.input_wait_time += perf_counter() - started
+            elif state == OUTPUT:
+                self._output(self._last_output)
             else:
-                raise Exception(f'invalid opcode: {opcode}')
-
-            num_parameters = operation.num_parameters()
-            parameters = tuple(self._memory[pos + 1:pos + num_parameters + 1])
-            modes = self._memory[pos][:-2].rjust(num_parameters, '0')
-            modes = tuple(reversed(modes))
-            parameters = zip(parameters, modes)
-            parameters = self.get_parameters(parameters)
-            operation = operation(parameters,
-                                  self._input,
-                                  self._output,
-                                  self.set_instruction_pointer,
-                                  self.adjust_relative_base)
-
-            if DEBUG:
-                print(f'performing operation: {operation.__class__.__name__}')
+                return
 
-            if operation.should_exit:
-                break
+    def feed(self, *values):
+        self._pending_input.extend(values)
 
-            await operation.perform_operation()
+    @property
+    def halted(self):
+        return self.state == HALTED
 
-            if not operation.modified_instruction_pointer:
-                if DEBUG:
-                    print(
-                        f'incrementing instruction pointer by {operation.increment_by()}')
-                self._pos += operation.increment_by()
+    def run_until_output(self, budget=None):
+        self.state = self._execute(budget)
+        if self.state == OUTPUT:
+            return self._last_output
+        return None
+
+    def run_until_input(self, budget=None):
+        outputs = []
+
+        while True:
+            if budget is None:
+                self.state = self._execute()
+            else:
+                count = self.instruction_count
+                self.state = self._execute(budget)
+                budget -= self.instruction_count - count
+
+            if self.state != OUTPUT:
+                return outputs
+            outputs.append(self._last_output)
+
+    def outputs(self):
+        while True:
+            self.state = self._execute()
+            if self.state == OUTPUT:
+                value = yield self._last_output
+            elif self.state == NEEDS_INPUT:
+                value = yield None
+            else:
+                return
+
+            if value is not None:
+                self.feed(value)
+
+    def _read_input(self):
+        value = self._input()
+        if inspect.iscoroutine(value):
+            # Input callbacks are usually coroutines that never actually
+            # suspend, so they can be stepped to completion without a loop.
+            try:
+                value.send(None)
+            except StopIteration as stop:
+                return stop.value
+            value.close()
+            raise Exception('input coroutine suspended; use run() instead')
+        return value
+
+    def _execute(self, budget=None):
+        if self.profiler is None:
+            return self._interpret(budget)
+        return self._execute_profiled(budget)
+
+    def _execute_profiled(self, budget=None):
+        # Step one instruction at a time so every instruction is seen; the
+        # plain interpreter stays free of any profiling checks.
+        profiler = self.profiler
+        started = perf_counter()
+
+        try:
+            while budget is None or budget > 0:
+                pos = self._pos
+                relative_base = self._relative_base
+                instruction = self._instructions.get(pos) or self.decode(pos)
+                count = self.instruction_count
+                state = self._interpret(1)
+                if self.instruction_count != count:
+                    profiler.record(pos, instruction, relative_base)
+                if state != SUSPENDED:
+                    return state
+                if budget is not None:
+                    budget -= 1
+            return SUSPENDED
+        except Exception:
+            profiler.dump()
+            raise
+        finally:
+            profiler.compute_time += perf_counter() - started
+
+    def _interpret(self, budget=None):
+        instructions = self._instructions
+        pending_input = self._pending_input
+        source = self._source
+        sink = self._sink
+        read = self._memory.read
+        write = self.set_memory_at_position
+        jit = self.jit
+        memory = self._memory
+        dense = memory._dense
+        decoded_from = self._decoded_from
+        blocks = self._blocks
+        heat = self._heat
+        pos = self._pos
+        relative_base = self._relative_base
+        # Counting down from -1 never reaches zero, so an unlimited run
+        # pays for the same check as a budgeted one.
+        remaining = start = -1 if budget is None else budget
+
+        try:
+            while True:
+                if remaining == 0:
+                    return SUSPENDED
+
+                if blocks:
+                    block = blocks.get(pos)
+                    if block is not None and (remaining < 0 or remaining >= block[1]):
+                        pos, relative_base, count = block[0](
+                            read, write, dense, memory._shared, decoded_from,
+                            blocks, relative_base, remaining)
+                        remaining -= count
+                        continue
+
+                remaining -= 1
+
+                instruction = instructions.get(pos)
+                if instruction is None:
+                    instruction = self.decode(pos)
+                opcode, modes, operands, _, _ = instruction
+
+                if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+                    mode1, mode2, mode3 = modes
+                    a, b, c = operands
+                    if mode1 != 1:
+                        a = read(a if mode1 == 0 else relative_base + a)
+                    if mode2 != 1:
+                        b = read(b if mode2 == 0 else relative_base + b)
+                    if mode3 == 1:
+                        raise Exception('cannot set value in immediate mode')
+                    if mode3 == 2:
+                        c += relative_base
+
+                    if opcode == 1:
+                        write(c, a + b)
+                    elif opcode == 2:
+                        write(c, a * b)
+                    elif opcode == 7:
+                        write(c, 1 if a < b else 0)
+                    else:
+                        write(c, 1 if a == b else 0)
+                    pos += 4
+                elif opcode == 5 or opcode == 6:
+                    mode1, mode2 = modes
+                    a, b = operands
+                    if mode1 != 1:
+                        a = read(a if mode1 == 0 else relative_base + a)
+                    if (a != 0) == (opcode == 5):
+                        if mode2 != 1:
+                            b = read(b if mode2 == 0 else relative_base + b)
+                        pos = b
+                    else:
+                        pos += 3
+
+                    if jit:
+                        entries = heat.get(pos, 0) + 1
+                        heat[pos] = entries
+                        if entries == JIT_THRESHOLD:
+                            self._compile(pos)
+                elif opcode == 3:
+                    if pending_input:
+                        value = pending_input.popleft()
+                    else:
+                        value = None
+                        if source is not None:
+                            value = next(source, None)
+                        if value is None:
+                            remaining += 1
+                            return NEEDS_INPUT
+                    mode1, = modes
+                    a, = operands
+                    if mode1 == 1:
+                        raise Exception('cannot set value in immediate mode')
+                    write(a if mode1 == 0 else relative_base + a, value)
+                    pos += 2
+                elif opcode == 4:
+                    mode1, = modes
+                    a, = operands
+                    if mode1 != 1:
+                        a = read(a if mode1 == 0 else relative_base + a)
+                    pos += 2
+                    if sink is not None:
+                        sink.append(a)
+                        continue
+                    self._last_output = a
+                    return OUTPUT
+                elif opcode == 9:
+                    mode1, = modes
+                    a, = operands
+                    if mode1 != 1:
+                        a = read(a if mode1 == 0 else relative_base + a)
+                    relative_base += a
+                    pos += 2
+                else:
+                    remaining += 1
+                    return HALTED
+        finally:
+            self._pos = pos
+            self._relative_base = relative_base
+            self.instruction_count += start - remaining
 
     def get_parameters(self, parameters):
         dispatch_table = {
-            '0': self.position_mode,
-            '1': self.immediate_mode,
-            '2': self.relative_mode
+            0: self.position_mode,
+            1: self.immediate_mode,
+            2: self.relative_mode
         }
 
         return tuple(
-            partial(dispatch_table[parameter_mode], int(parameter))
+            partial(dispatch_table[parameter_mode], parameter)
             for parameter, parameter_mode in parameters
         )
 
@@ -113,30 +632,161 @@ class IntCodeComputer:
             self.set_memory_at_position(self._relative_base + parameter, value)
 
     def set_memory_at_position(self, pos, value):
-        if pos < 0:
-            raise Exception('negative address is illegal')
-        while pos > len(self._memory) - 1:
-            self._memory.append('0')
-        if DEBUG:
-            print(f'placing {value} into position {pos}')
-        self._memory[pos] = str(value)
+        self._memory.write(pos, value)
+        if pos in self._decoded_from:
+            self.invalidate(pos)
 
     def get_memory_at_position(self, pos):
-        if pos < 0:
-            raise Exception('negative address is illegal')
-        while pos > len(self._memory) - 1:
-            self._memory.append('0')
-        return self._memory[pos]
+        return self._memory.read(pos)
+
+    def memory_stats(self):
+        return self._memory.stats()
+
+    def snapshot(self):
+        return Snapshot(self._memory.copy(),
+                        self._pos,
+                        self._relative_base,
+                        tuple(self._pending_input),
+                        self.state)
+
+    def restore(self, snapshot):
+        # Copy again so the same snapshot can be restored any number of times.
+        self._memory = snapshot.memory.copy()
+        self._pos = snapshot.pos
+        self._relative_base = snapshot.relative_base
+        self._pending_input.clear()
+        self._pending_input.extend(snapshot.pending_input)
+        self.state = snapshot.state
+        self._instructions = {}
+        self._decoded_from = {}
+        self._blocks = {}
+        self._heat = {}
+
+    def fork(self, inp=None, outp=None):
+        computer = copy(self)
+        computer._memory = self._memory.copy()
+        computer._pending_input = deque(self._pending_input)
+        # Cached instructions hold accessors bound to this computer.
+        computer._instructions = {}
+        computer._decoded_from = {}
+        computer._blocks = {}
+        computer._heat = {}
+        if inp is not None:
+            computer._connect_input(inp)
+        elif self._input == self._next_input:
+            # Keep reading from the channel, but through the fork's queue and
+            # its own copy of the rest of an iterable source.
+            computer._input = computer._next_input
+            if self._source is not None:
+                self._source, computer._source = tee(self._source)
+        if outp is None and self.output_buffer is not None:
+            # A fork buffers its own outputs in a fresh OutputBuffer. An
+            # output callback is shared with the parent unless outp is given.
+            outp = OutputBuffer(self.output_buffer.frame_size)
+        if outp is not None:
+            computer._connect_output(outp)
+        elif self._framer is not None:
+            # The callback is shared, but each side finishes its own frames.
+            computer._connect_output(self._framer.outp, self._string_output,
+                                     self._framer.frame_size)
+            computer._framer.frame.extend(self._framer.frame)
+        return computer
 
     def set_instruction_pointer(self, pos):
-        if DEBUG:
-            print(f'setting instruction pointer to {pos}')
-        self._pos = int(pos)
+        self._pos = pos
 
     def adjust_relative_base(self, value):
-        if DEBUG:
-            print(f'adjusting relative base by {value}')
-        self._relative_base += int(value)
+        self._relative_base += value
+
+
+class Framer:
+    # Collects outputs into tuples of frame_size before passing them on.
+    def __init__(self, outp, frame_size):
+        self.outp = outp
+        self.frame_size = frame_size
+        self.frame = []
+
+    def __call__(self, value):
+        self.frame.append(value)
+        if len(self.frame) == self.frame_size:
+            self.outp(tuple(self.frame))
+            self.frame.clear()
+
+
+# Memory is split into fixed-size pages. Pages covering the program image are
+# kept in a dense list; pages past it are zero-filled and only allocated on
+# first write, so reads of untouched pages allocate nothing. Copies share
+# every page until one side writes to it.
+class PagedMemory:
+    def __init__(self, image):
+        image = list(image)
+        self._size = len(image)
+        self._dense = [image[start:start + PAGE_SIZE]
+                       for start in range(0, self._size, PAGE_SIZE)]
+        if self._dense:
+            self._dense[-1].extend(
+                [0] * (PAGE_SIZE - len(self._dense[-1])))
+        self._dense_count = len(self._dense)
+        self._pages = {}
+        self._shared = set()
+        self.untouched_reads = 0
+        self.copied_pages = 0
+
+    def read(self, address):
+        index = address >> PAGE_BITS
+        if index < self._dense_count:
+            if address < 0:
+                raise Exception('negative address is illegal')
+            return self._dense[index][address & PAGE_MASK]
+
+        page = self._pages.get(index)
+        if page is None:
+            self.untouched_reads += 1
+            return 0
+        return page[address & PAGE_MASK]
+
+    def write(self, address, value):
+        index = address >> PAGE_BITS
+        if index < self._dense_count:
+            if address < 0:
+                raise Exception('negative address is illegal')
+            pages = self._dense
+            page = pages[index]
+        else:
+            pages = self._pages
+            page = pages.get(index)
+            if page is None:
+                page = pages[index] = [0] * PAGE_SIZE
+
+        if self._shared and index in self._shared:
+            page = pages[index] = page.copy()
+            self._shared.discard(index)
+            self.copied_pages += 1
+
+        page[address & PAGE_MASK] = value
+
+    def copy(self):
+        memory = copy(self)
+        memory._dense = self._dense.copy()
+        memory._pages = self._pages.copy()
+        self._shared = set(range(self._dense_count)) | set(self._pages)
+        memory._shared = self._shared.copy()
+        memory.untouched_reads = 0
+        memory.copied_pages = 0
+        return memory
+
+    def stats(self):
+        return {
+            'image_size': self._size,
+            'page_size': PAGE_SIZE,
+            'image_pages': self._dense_count,
+            'touched_pages': len(self._pages),
+            'shared_pages': len(self._shared),
+            'copied_pages': self.copied_pages,
+            'untouched_reads': self.untouched_reads,
+            'working_set': (self._dense_count + len(self._pages)) * PAGE_SIZE,
+            'highest_page': max(self._pages, default=None)
+        }
 
 
 class Operation:
@@ -169,9 +819,7 @@ class AddOperation(Operation):
 
     async def perform_operation(self):
         operand1, operand2, target = self.parameters
-        if DEBUG:
-            print(f'adding {operand1()} and {operand2()}')
-        target(int(operand1()) + int(operand2()))
+        target(operand1() + operand2())
 
 
 class MultiplyOperation(Operation):
@@ -181,9 +829,7 @@ class MultiplyOperation(Operation):
 
     async def perform_operation(self):
         operand1, operand2, target = self.parameters
-        if DEBUG:
-            print(f'multiplying {operand1()} and {operand2()}')
-        target(int(operand1()) * int(operand2()))
+        target(operand1() * operand2())
 
 
 class SaveOperation(Operation):
@@ -193,8 +839,6 @@ class SaveOperation(Operation):
 
     async def perform_operation(self):
         target, = self.parameters
-        if DEBUG:
-            print(f'getting input')
         target(await self._input())
 
 
@@ -205,8 +849,6 @@ class LoadOperation(Operation):
 
     async def perform_operation(self):
         target, = self.parameters
-        if DEBUG:
-            print(f'outputting {target()}')
         self._output(target())
 
 
@@ -234,16 +876,12 @@ class JumpOperation(Operation):
 
 class JumpIfTrueOperation(JumpOperation):
     def evaluate(self, value):
-        if DEBUG:
-            print(f'evaluating {value} != 0')
-        return int(value) != 0
+        return value != 0
 
 
 class JumpIfFalseOperation(JumpOperation):
     def evaluate(self, value):
-        if DEBUG:
-            print(f'evaluating {value} == 0')
-        return int(value) == 0
+        return value == 0
 
 
 class CompareOperation(Operation):
@@ -264,16 +902,12 @@ class CompareOperation(Operation):
 
 class LessThanOperation(CompareOperation):
     def evaluate(self, value1, value2):
-        if DEBUG:
-            print(f'evaluating {value1} < {value2}')
-        return int(value1) < int(value2)
+        return value1 < value2
 
 
 class EqualsOperation(CompareOperation):
     def evaluate(self, value1, value2):
-        if DEBUG:
-            print(f'evaluating {value1} == {value2}')
-        return int(value1) == int(value2)
+        return value1 == value2
 
 
 class AdjustRelativeBaseOperation(Operation):
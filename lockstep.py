@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+from itertools import permutations
+import fileinput
+
+import numpy as np
+
+from intcode import (IntCodeComputer, PagedMemory, Snapshot,
+                     NEEDS_INPUT, HALTED)
+
+RUNNING = 'running'
+
+# Values at or beyond this magnitude could overflow int64 arithmetic; lanes
+# that produce them finish on the scalar computer, which uses Python ints.
+SAFE_MAGNITUDE = 2 ** 62
+
+
+def main():
+    opcodes = fileinput.input().readline().strip().split(',')
+    print(max(feedback_loop_search(opcodes, range(5, 10))))
+
+
+def feedback_loop_search(program, phases):
+    # One batch per amplifier position, one lane per phase permutation.
+    settings = list(permutations(phases))
+    amplifiers = [LockstepBatch(program, [[phase_settings[index]]
+                                          for phase_settings in settings])
+                  for index in range(len(settings[0]))]
+    signals = [[0] for _ in settings]
+
+    while True:
+        for amplifier in amplifiers:
+            for lane, values in enumerate(signals):
+                amplifier.feed(lane, *values)
+            amplifier.run()
+            signals = amplifier.take_outputs()
+
+        if all(state == HALTED for state in amplifiers[-1].states):
+            return [values[-1] for values in signals]
+
+
+class LockstepBatch:
+    def __init__(self, program, inputs, memory_size=None, min_group_size=2):
+        program = [int(value) for value in program]
+        lanes = len(inputs)
+        if memory_size is None:
+            memory_size = len(program) + 4096
+
+        self.lanes = lanes
+        self.memory_size = memory_size
+        self.min_group_size = min_group_size
+        self.program = program
+        self.ip = np.zeros(lanes, dtype=np.int64)
+        self.relative_base = np.zeros(lanes, dtype=np.int64)
+        self.active = np.ones(lanes, dtype=bool)
+        self.states = [RUNNING] * lanes
+        self.inputs = [list(values) for values in inputs]
+        self.outputs = [[] for _ in range(lanes)]
+        self.steps = 0
+        self.fallbacks = 0
+        self._scalar = {}
+
+        self.memory = np.zeros((lanes, memory_size), dtype=np.int64)
+        try:
+            self.memory[:, :len(program)] = np.array(program, dtype=np.int64)
+        except OverflowError:
+            # The image itself needs big ints; run every lane on its own.
+            for lane in range(lanes):
+                computer = IntCodeComputer(program)
+                computer.feed(*self.inputs[lane])
+                self._adopt(lane, computer)
+
+    def feed(self, lane, *values):
+        if lane in self._scalar:
+            self._scalar[lane].feed(*values)
+        else:
+            self.inputs[lane].extend(values)
+        if self.states[lane] == NEEDS_INPUT:
+            self.states[lane] = RUNNING
+            self.active[lane] = lane not in self._scalar
+
+    def take_outputs(self):
+        outputs = self.outputs
+        self.outputs = [[] for _ in range(self.lanes)]
+        return outputs
+
+    def run(self, max_steps=None):
+        for lane, computer in self._scalar.items():
+            if self.states[lane] == RUNNING:
+                self._run_scalar(lane, computer)
+
+        while max_steps is None or max_steps > 0:
+            if not self.step():
+                break
+            if max_steps is not None:
+                max_steps -= 1
+
+        return self.outputs
+
+    def step(self):
+        lanes = np.flatnonzero(self.active)
+        if not len(lanes):
+            return False
+
+        self.steps += 1
+        ips = self.ip[lanes]
+        outside = (ips < 0) | (ips >= self.memory_size)
+        if outside.any():
+            # Jumped off the end of the lane's memory; the scalar computer
+            # runs or reports these like any other diverging lane.
+            self._fall_back(lanes[outside])
+            lanes, ips = lanes[~outside], ips[~outside]
+            if not len(lanes):
+                return True
+        words = self.memory[lanes, ips]
+        if (ips == ips[0]).all() and (words == words[0]).all():
+            # Every lane is at the same instruction: the common case.
+            if len(lanes) < self.min_group_size:
+                self._fall_back(lanes)
+            else:
+                self._execute(lanes, int(ips[0]), int(words[0]))
+            return True
+
+        order = np.lexsort((words, ips))
+        lanes, ips, words = lanes[order], ips[order], words[order]
+        starts = np.flatnonzero(np.concatenate((
+            [True], (ips[1:] != ips[:-1]) | (words[1:] != words[:-1]))))
+        ends = np.append(starts[1:], len(lanes))
+
+        for start, end in zip(starts, ends):
+            group = lanes[start:end]
+            if len(group) < self.min_group_size:
+                # This lane went its own way; vectorising it gains nothing.
+                self._fall_back(group)
+            else:
+                self._execute(group, int(ips[start]), int(words[start]))
+
+        return True
+
+    def _execute(self, lanes, ip, word):
+        opcode = word % 100
+        modes = (word // 100 % 10, word // 1000 % 10, word // 10000 % 10)
+
+        if opcode in (1, 2, 7, 8):
+            a, ok = self._load(lanes, ip + 1, modes[0])
+            b, ok_b = self._load(lanes, ip + 2, modes[1])
+            target, ok_target = self._address(lanes, ip + 3, modes[2])
+            ok &= ok_b & ok_target
+
+            if opcode == 1:
+                ok &= (np.abs(a) < SAFE_MAGNITUDE) & (np.abs(b) < SAFE_MAGNITUDE)
+                value = a + b
+            elif opcode == 2:
+                ok &= np.abs(a.astype(np.float64) * b) < SAFE_MAGNITUDE
+                value = a * b
+            elif opcode == 7:
+                value = (a < b).astype(np.int64)
+            else:
+                value = (a == b).astype(np.int64)
+
+            lanes, target, value = self._keep(lanes, ok, target, value)
+            self.memory[lanes, target] = value
+            self.ip[lanes] += 4
+        elif opcode == 5 or opcode == 6:
+            a, ok = self._load(lanes, ip + 1, modes[0])
+            b, ok_b = self._load(lanes, ip + 2, modes[1])
+            jump = a != 0 if opcode == 5 else a == 0
+            ok &= ok_b | ~jump
+
+            lanes, jump, b = self._keep(lanes, ok, jump, b)
+            self.ip[lanes] = np.where(jump, b, ip + 3)
+        elif opcode == 3:
+            target, ok = self._address(lanes, ip + 1, modes[0])
+            waiting = np.array([not self.inputs[lane] for lane in lanes])
+            values = [self.inputs[lane][0] if self.inputs[lane] else 0
+                      for lane in lanes]
+            ok &= np.array([abs(value) < SAFE_MAGNITUDE for value in values])
+            values = np.array([value if abs(value) < SAFE_MAGNITUDE else 0
+                               for value in values], dtype=np.int64)
+
+            # Lanes without input wait here until feed() supplies more.
+            for lane in lanes[waiting]:
+                self.active[lane] = False
+                self.states[lane] = NEEDS_INPUT
+
+            lanes, target, values = self._keep(
+                lanes, ok, target, values, waiting=waiting)
+            for lane in lanes:
+                self.inputs[lane].pop(0)
+            self.memory[lanes, target] = values
+            self.ip[lanes] += 2
+        elif opcode == 4:
+            a, ok = self._load(lanes, ip + 1, modes[0])
+            lanes, a = self._keep(lanes, ok, a)
+            for lane, value in zip(lanes, a.tolist()):
+                self.outputs[lane].append(value)
+            self.ip[lanes] += 2
+        elif opcode == 9:
+            a, ok = self._load(lanes, ip + 1, modes[0])
+            ok &= np.abs(a) < SAFE_MAGNITUDE
+            lanes, a = self._keep(lanes, ok, a)
+            self.relative_base[lanes] += a
+            self.ip[lanes] += 2
+        elif opcode == 99:
+            self.active[lanes] = False
+            for lane in lanes:
+                self.states[lane] = HALTED
+        else:
+            # Let the scalar computer report the invalid opcode.
+            self._fall_back(lanes)
+
+    def _keep(self, lanes, ok, *columns, waiting=None):
+        # Lanes that cannot finish this instruction here move to the scalar
+        # computer before it has any effect.
+        if waiting is None:
+            failed = ~ok
+        else:
+            failed = ~ok & ~waiting
+            ok = ok & ~waiting
+        if failed.any():
+            self._fall_back(lanes[failed])
+        return (lanes[ok],) + tuple(column[ok] for column in columns)
+
+    def _load(self, lanes, slot, mode):
+        if slot >= self.memory_size:
+            return (np.zeros(len(lanes), dtype=np.int64),
+                    np.zeros(len(lanes), dtype=bool))
+
+        raw = self.memory[lanes, slot]
+        if mode == 1:
+            return raw, np.ones(len(lanes), dtype=bool)
+
+        address = raw if mode == 0 else self.relative_base[lanes] + raw
+        ok = (address >= 0) & (address < self.memory_size)
+        return self.memory[lanes, np.where(ok, address, 0)], ok
+
+    def _address(self, lanes, slot, mode):
+        if slot >= self.memory_size or mode == 1:
+            return (np.zeros(len(lanes), dtype=np.int64),
+                    np.zeros(len(lanes), dtype=bool))
+
+        raw = self.memory[lanes, slot]
+        address = raw if mode == 0 else self.relative_base[lanes] + raw
+        ok = (address >= 0) & (address < self.memory_size)
+        return np.where(ok, address, 0), ok
+
+    def _fall_back(self, lanes):
+        for lane in lanes:
+            lane = int(lane)
+            computer = IntCodeComputer([])
+            computer.restore(Snapshot(PagedMemory(self.memory[lane].tolist()),
+                                      int(self.ip[lane]),
+                                      int(self.relative_base[lane]),
+                                      tuple(self.inputs[lane]),
+                                      None))
+            self._adopt(lane, computer)
+
+    def _adopt(self, lane, computer):
+        self.inputs[lane] = []
+        self.active[lane] = False
+        self.states[lane] = RUNNING
+        self._scalar[lane] = computer
+        self.fallbacks += 1
+        self._run_scalar(lane, computer)
+
+    def _run_scalar(self, lane, computer):
+        self.outputs[lane].extend(computer.run_until_input())
+        self.states[lane] = HALTED if computer.halted else NEEDS_INPUT
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 
-from math import sqrt, atan2, cos, sin, pi
-from itertools import groupby
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cmp_to_key
+from math import gcd
+from itertools import islice
 import fileinput
 
+import numpy as np
+
 
 def main():
     map = Map(line.strip() for line in fileinput.input())
@@ -11,126 +16,304 @@ def main():
     print(map.vaporize_asteroids(200))
 
 
+# Roughly how many origin/target pairs the NumPy engine handles at once.
+BLOCK_SIZE = 1 << 20
+# Maps whose offsets fit a table this big look their gcds up instead.
+GCD_TABLE_SIZE = 1 << 22
+
+
+def count_visible(asteroids, engine='numpy', processes=None):
+    # How many other asteroids each asteroid can see. Two asteroids are in
+    # line with an origin exactly when their offsets from it reduce, by
+    # their gcd, to the same direction.
+    asteroids = list(asteroids)
+    if engine not in ENGINES:
+        raise Exception(f'unknown engine: {engine}')
+
+    origins = range(len(asteroids))
+    if not processes or processes < 2:
+        return ENGINES[engine](asteroids, origins)
+
+    size = -(-len(asteroids) // (processes * 4)) or 1
+    chunks = [origins[start:start + size] for start in range(0, len(asteroids), size)]
+    counts = []
+    with ProcessPoolExecutor(processes, initializer=_attach, initargs=(asteroids,)) as executor:
+        for chunk_counts in executor.map(_count_chunk, [engine] * len(chunks), chunks):
+            counts.extend(chunk_counts)
+    return counts
+
+
+def _count_visible(asteroids, origins):
+    counts = []
+    for index in origins:
+        origin_x, origin_y = asteroids[index]
+        directions = set()
+        for x, y in asteroids:
+            dx, dy = x - origin_x, y - origin_y
+            divisor = gcd(dx, dy)
+            if divisor:
+                directions.add((dx // divisor, dy // divisor))
+        counts.append(len(directions))
+    return counts
+
+
+def _count_visible_numpy(asteroids, origins):
+    if not asteroids:
+        return []
+    points = np.array(asteroids, dtype=np.int64)
+    xs, ys = points[:, 0], points[:, 1]
+    width = int(xs.max() - xs.min())
+    height = int(ys.max() - ys.min())
+    origins = np.asarray(origins, dtype=np.int64)
+    table = None
+    if (width + 1) * (height + 1) <= GCD_TABLE_SIZE:
+        table = np.gcd.outer(np.arange(width + 1), np.arange(height + 1)).ravel()
+        table[0] = 1
+
+    counts = []
+    block = max(1, BLOCK_SIZE // len(points))
+    for start in range(0, len(origins), block):
+        index = origins[start:start + block]
+        dx = xs - xs[index, None]
+        dy = ys - ys[index, None]
+        if table is not None:
+            divisor = table[np.abs(dx) * (height + 1) + np.abs(dy)]
+        else:
+            divisor = np.gcd(dx, dy)
+            divisor[divisor == 0] = 1
+        # One key per reduced direction. After sorting, each direction
+        # other than the origin's own (0, 0) starts a new run.
+        keys = (dx // divisor + width) * (2 * height + 1) + dy // divisor + height
+        keys.sort(axis=1)
+        counts.extend(np.count_nonzero(np.diff(keys, axis=1), axis=1).tolist())
+    return counts
+
+
+ENGINES = {
+    'python': _count_visible,
+    'numpy': _count_visible_numpy
+}
+
+
+# Set in each worker process by _attach().
+_asteroids = None
+
+
+def _attach(asteroids):
+    global _asteroids
+    _asteroids = asteroids
+
+
+def _count_chunk(engine, origins):
+    return ENGINES[engine](_asteroids, origins)
+
+
 class Map:
     def __init__(self, lines):
-        self.map = {(x, y): char for y, line in enumerate(lines)
-                    for x, char in enumerate(line)}
-
-    def find_best_monitoring_location(self):
-        best_monitoring_location = max({
-            origin: len(
-                set(
-                    Point.from_cartesian(
-                        asteroid[0] - origin[0], asteroid[1] - origin[1]
-                    ).theta
-                    for asteroid in self.asteroids())
-            )
-            for origin in self.asteroids()
-        }.items(), key=lambda item: item[1])
+        rows = [line.encode() for line in lines]
+        self.height = len(rows)
+        self.width = max((len(row) for row in rows), default=0)
+        # One flag per cell, plus the asteroids' coordinates in reading
+        # order so nothing has to rescan the map.
+        self.bitmap = np.zeros((self.height, self.width), dtype=bool)
+        for y, row in enumerate(rows):
+            self.bitmap[y, :len(row)] = np.frombuffer(row, dtype=np.uint8) == ord('#')
+        ys, xs = np.nonzero(self.bitmap)
+        self.coordinates = np.column_stack((xs, ys))
+        self.best_monitoring_location = None
+        # Per-cell visible counts, kept up to date once track_visibility()
+        # has been called.
+        self.visible = None
+
+    def find_best_monitoring_location(self, engine='numpy', processes=None):
+        if self.visible is not None:
+            return self._best_tracked()
+
+        asteroids = self.coordinates.tolist()
+        best_monitoring_location = max(
+            zip(self.asteroids(), count_visible(asteroids, engine, processes)),
+            key=lambda item: item[1])
 
         self.best_monitoring_location = best_monitoring_location[0]
         return best_monitoring_location
 
+    def track_visibility(self, engine='numpy', processes=None):
+        self.visible = np.zeros((self.height, self.width), dtype=np.int64)
+        counts = count_visible(self.coordinates.tolist(), engine, processes)
+        self.visible[self.coordinates[:, 1], self.coordinates[:, 0]] = counts
+        return self._best_tracked()
+
+    def add_asteroid(self, asteroid):
+        x, y = self._check_cell(asteroid)
+        if self.bitmap[y, x]:
+            raise Exception(f'there is already an asteroid at {asteroid}')
+
+        if self.visible is not None:
+            gaining, count = self._unopposed_neighbours(asteroid)
+            self.visible[gaining[:, 1], gaining[:, 0]] += 1
+            self.visible[y, x] = count
+
+        self.bitmap[y, x] = True
+        # Keep the index in reading order.
+        position = np.searchsorted(self.coordinates[:, 1] * self.width + self.coordinates[:, 0],
+                                   y * self.width + x)
+        self.coordinates = np.insert(self.coordinates, position, (x, y), axis=0)
+        self._update_best()
+
+    def remove_asteroid(self, asteroid):
+        x, y = self._check_cell(asteroid)
+        if not self.bitmap[y, x]:
+            raise Exception(f'there is no asteroid at {asteroid}')
+
+        self.bitmap[y, x] = False
+        keep = (self.coordinates[:, 0] != x) | (self.coordinates[:, 1] != y)
+        self.coordinates = self.coordinates[keep]
+
+        if self.visible is not None:
+            losing, _ = self._unopposed_neighbours(asteroid)
+            self.visible[losing[:, 1], losing[:, 0]] -= 1
+            self.visible[y, x] = 0
+        self._update_best()
+
+    def _check_cell(self, asteroid):
+        x, y = asteroid
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise Exception(f'{asteroid} is outside the map')
+        return x, y
+
+    def _unopposed_neighbours(self, asteroid):
+        # The asteroids whose visible count depends on the given cell, and
+        # how many directions the cell itself sees. From the cell, only the
+        # nearest asteroid along each direction can see it, and only when
+        # nothing lies in the opposite direction; otherwise that line of
+        # sight is taken either way.
+        xs, ys = self.coordinates[:, 0], self.coordinates[:, 1]
+        dx, dy = xs - asteroid[0], ys - asteroid[1]
+        others = np.nonzero((dx != 0) | (dy != 0))[0]
+        if not len(others):
+            return self.coordinates[others], 0
+
+        dx, dy = dx[others], dy[others]
+        divisor = np.gcd(dx, dy)
+        dx, dy = dx // divisor, dy // divisor
+        span = 2 * self.height + 1
+        keys = (dx + self.width) * span + dy + self.height
+        opposites = (self.width - dx) * span + self.height - dy
+
+        order = np.lexsort((divisor, keys))
+        sorted_keys = keys[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        nearest = order[first]
+        unopposed = nearest[~np.isin(opposites[nearest], sorted_keys[first])]
+        return self.coordinates[others[unopposed]], int(np.count_nonzero(first))
+
+    def _update_best(self):
+        if self.visible is not None:
+            self._best_tracked()
+        else:
+            self.best_monitoring_location = None
+
+    def _best_tracked(self):
+        if not len(self.coordinates):
+            self.best_monitoring_location = None
+            return None
+        counts = self.visible[self.coordinates[:, 1], self.coordinates[:, 0]]
+        # argmax takes the first best in reading order, like max() over
+        # asteroids() does.
+        best = int(np.argmax(counts))
+        self.best_monitoring_location = tuple(self.coordinates[best].tolist())
+        return self.best_monitoring_location, int(counts[best])
+
     def vaporize_asteroids(self, vaporized_count):
+        if vaporized_count < 1:
+            return None
+        return next(islice(self.vaporization_order(), vaporized_count - 1, None), None)
+
+    def vaporization_order(self):
         if self.best_monitoring_location is None:
             self.find_best_monitoring_location()
-        
-        # Get data about all points using the best monitoring location
-        # as the origin of the coordinate system.
-        points = {
-            asteroid: Point.from_cartesian(
-                asteroid[0] - self.best_monitoring_location[0],
-                asteroid[1] - self.best_monitoring_location[1]
-            )
-            for asteroid in self.asteroids()
+
+        # The laser takes the nearest asteroid in each direction per turn, so
+        # a turn is one pass over the direction queues in clockwise order.
+        queues = self._angular_queues(self.best_monitoring_location)
+        while queues:
+            remaining = []
+            for queue in queues:
+                yield queue.popleft()
+                if queue:
+                    remaining.append(queue)
+            queues = remaining
+
+    def _angular_queues(self, station):
+        directions = defaultdict(list)
+        for asteroid in self.asteroids():
+            dx, dy = asteroid[0] - station[0], asteroid[1] - station[1]
             # Ignore the monitoring station
-            if asteroid != self.best_monitoring_location
-        }
-
-        number = 0
-
-        while len(points):
-            def quadrant_lambda(item): return item[1].quadrant()
-            def theta_lambda(item): return item[1].theta
-            def r_lambda(item): return item[1].r
-
-            # Create dictionary of form:
-            # {
-            #   quadrant: {
-            #       angle: [list of points on that angle, sorted by distance from origin]
-            #   }
-            # }
-            quadrants = {
-                quadrant: {
-                    angle:
-                    sorted((asteroid for asteroid in angle_group),
-                           key=r_lambda)
-                    for angle, angle_group in
-                    groupby(sorted(quadrant_group, key=theta_lambda),
-                            key=theta_lambda)
-                }
-                for quadrant, quadrant_group in
-                groupby(sorted(points.items(), key=quadrant_lambda),
-                        key=quadrant_lambda)
-            }
-
-            # Clockwise starting at 12 o'clock means going through quadrants in order: 1, 4, 3, 2.
-            # Within each quadrant, look at angles in decreasing order
-            for quadrant in 1, 4, 3, 2:
-                if quadrant not in quadrants:
-                    continue
-                quadrant_group = quadrants[quadrant]
-                # Sort by angle (the key of the quadrant_group dictionary)
-                for _, asteroids in sorted(quadrant_group.items(), key=lambda item: item[0], reverse=True):
-                    closest_asteroid, _ = asteroids[0]
-                    del points[closest_asteroid]
-                    number += 1
-                    if number == vaporized_count:
-                        return closest_asteroid
-
-        return None
+            if dx or dy:
+                divisor = gcd(dx, dy)
+                directions[dx // divisor, dy // divisor].append((divisor, asteroid))
+
+        return [deque(asteroid for _, asteroid in sorted(directions[direction]))
+                for direction in sorted(directions, key=cmp_to_key(clockwise))]
+
+    def visible_asteroids(self, origin):
+        # The nearest asteroid in every direction, clockwise from straight up.
+        return [queue[0] for queue in self._angular_queues(origin)]
 
     def asteroids(self):
-        return (coord for coord, value in self.map.items() if value == '#')
-
-
-class Point():
-    @classmethod
-    def from_cartesian(cls, x, y):
-        point = cls()
-        point.x = x
-        point.y = y
-        point._calculate_polar()
-        return point
-
-    @classmethod
-    def from_polar(cls, r, theta):
-        point = cls()
-        point.r = r
-        point.theta = theta
-        point._calculate_cartesian()
-        return point
-
-    def quadrant(self):
-        if self.theta >= 0 and self.theta <= pi/2:
-            return 1
-        if self.theta > pi/2 and self.theta <= pi:
-            return 2
-        if self.theta >= -pi and self.theta < -pi/2:
-            return 3
-        if self.theta >= -pi/2 and self.theta < 0:
-            return 4
-
-    def _calculate_cartesian(self):
-        self.x = self.r * cos(self.theta)
-        self.y = self.r * sin(self.theta)
-
-    def _calculate_polar(self):
-        self.r = sqrt(self.x * self.x + self.y * self.y)
-        # Negative atan2 because the lower the y coordinate
-        # the higher the coordinate in actual space
-        self.theta = -atan2(self.y, self.x)
-        self.theta = 0 if self.theta == -0 else self.theta
+        return (tuple(coord) for coord in self.coordinates.tolist())
+
+    def asteroids_in_rectangle(self, left, top, right, bottom):
+        # Corners are inclusive.
+        if right < 0 or bottom < 0:
+            return []
+        left, top = max(left, 0), max(top, 0)
+        ys, xs = np.nonzero(self.bitmap[top:bottom + 1, left:right + 1])
+        return list(zip((xs + left).tolist(), (ys + top).tolist()))
+
+    def asteroids_along_ray(self, origin, direction):
+        # Asteroids on the cells the ray passes through exactly, nearest
+        # first. The origin itself is not included.
+        dx, dy = direction
+        divisor = gcd(dx, dy)
+        if not divisor:
+            raise Exception('ray has no direction')
+        dx, dy = dx // divisor, dy // divisor
+
+        # The origin may be off the map, so find the steps for which both
+        # coordinates are inside it.
+        first_x, last_x = self._steps_inside(origin[0], dx, self.width)
+        first_y, last_y = self._steps_inside(origin[1], dy, self.height)
+        first, last = max(1, first_x, first_y), min(last_x, last_y)
+        if first > last:
+            return []
+        k = np.arange(first, last + 1)
+        xs, ys = origin[0] + k * dx, origin[1] + k * dy
+        hits = self.bitmap[ys, xs]
+        return list(zip(xs[hits].tolist(), ys[hits].tolist()))
+
+    def _steps_inside(self, start, step, size):
+        # First and last k for which start + k * step lies in [0, size).
+        if step > 0:
+            return -(start // step), (size - 1 - start) // step
+        if step < 0:
+            return -((size - 1 - start) // -step), start // -step
+        # Not moving along this axis: no limit, or never inside.
+        if 0 <= start < size:
+            return 0, float('inf')
+        return 1, 0
+
+
+def clockwise(first, second):
+    # Orders directions clockwise starting straight up. y grows downwards,
+    # so the right half comes first and, within a half, a positive cross
+    # product means a clockwise turn.
+    first_half = 0 if first[0] > 0 or (first[0] == 0 and first[1] < 0) else 1
+    second_half = 0 if second[0] > 0 or (second[0] == 0 and second[1] < 0) else 1
+    if first_half != second_half:
+        return first_half - second_half
+    return second[0] * first[1] - first[0] * second[1]
 
 
 if __name__ == '__main__':
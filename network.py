@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+from collections import deque, namedtuple
+from time import perf_counter
+import fileinput
+
+from intcode import IntCodeComputer, HALTED, NEEDS_INPUT
+
+
+def main():
+    opcodes = fileinput.input().readline().strip().split(',')
+    supervisor = NatSupervisor()
+    network = Network(opcodes, 50, supervisor)
+    network.run()
+
+    print(supervisor.first.payload[1])
+    print(supervisor.result)
+    print(network.stats())
+
+
+Packet = namedtuple('Packet', ['source', 'destination', 'payload'])
+
+
+class Supervisor:
+    # Receives every packet sent to the supervisor address. When the whole
+    # network goes idle, idle() may send packets to wake it back up and
+    # returns True to keep running.
+    def receive(self, network, packet):
+        pass
+
+    def idle(self, network):
+        return False
+
+
+class NatSupervisor(Supervisor):
+    # Day 23's NAT: remembers the last packet it was sent and hands it to
+    # node 0 whenever the network is idle, until it sends the same Y twice
+    # in a row.
+    def __init__(self, wake_address=0):
+        self.wake_address = wake_address
+        self.first = None
+        self.last = None
+        self.delivered = None
+        self.result = None
+
+    def receive(self, network, packet):
+        if self.first is None:
+            self.first = packet
+        self.last = packet
+
+    def idle(self, network):
+        if self.last is None:
+            return False
+
+        y = self.last.payload[-1]
+        if y == self.delivered:
+            self.result = y
+            return False
+        self.delivered = y
+        network.send(self.wake_address, *self.last.payload)
+        return True
+
+
+class Node:
+    def __init__(self, address, computer, inbox):
+        self.address = address
+        self.computer = computer
+        self.inbox = inbox
+        self.partial = []
+        self.scheduled = False
+        self.empty_reads = 0
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.compute_time = 0.0
+
+    def stats(self):
+        instructions = self.computer.instruction_count
+        return {
+            'instructions': instructions,
+            'instructions_per_second': (instructions / self.compute_time
+                                        if self.compute_time else 0.0),
+            'packets_sent': self.packets_sent,
+            'packets_received': self.packets_received,
+        }
+
+
+class Network:
+    # Runs one VM per address. Nodes read straight from their inbox and are
+    # only scheduled while they have something to do: a node blocked on an
+    # empty inbox is parked until a packet arrives, so the network is idle
+    # exactly when nothing is left to run.
+    def __init__(self, program, size, supervisor=None, supervisor_address=255,
+                 packet_size=2, budget=10000, empty_input=-1, idle_polls=2,
+                 **options):
+        self.supervisor = supervisor or Supervisor()
+        self.supervisor_address = supervisor_address
+        self.packet_size = packet_size
+        self.budget = budget
+        # Day 23 programs poll with -1 when their queue is empty. A node that
+        # has read it idle_polls times in a row without sending anything is
+        # parked instead of being spun. With empty_input=None a node simply
+        # blocks until a packet arrives.
+        self.empty_input = empty_input
+        self.idle_polls = idle_polls
+        self.packets = 0
+        self.idle_count = 0
+        self.elapsed = 0.0
+        self._runnable = deque()
+        self._stopped = False
+
+        template = IntCodeComputer(program, **options)
+        self.nodes = {}
+        for address in range(size):
+            inbox = deque([address])
+            node = Node(address, template.fork(inp=inbox), inbox)
+            self.nodes[address] = node
+            self._schedule(node)
+
+    def send(self, destination, *payload, source=None):
+        packet = Packet(source, destination, payload)
+        self.packets += 1
+
+        if destination == self.supervisor_address:
+            self.supervisor.receive(self, packet)
+            return
+        if destination not in self.nodes:
+            raise Exception(f'no node at address {destination}')
+
+        node = self.nodes[destination]
+        node.inbox.extend(payload)
+        node.packets_received += 1
+        node.empty_reads = 0
+        self._schedule(node)
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        self._stopped = False
+        started = perf_counter()
+
+        try:
+            while not self._stopped:
+                if not self._runnable:
+                    self.idle_count += 1
+                    if not self.supervisor.idle(self) or not self._runnable:
+                        break
+                    continue
+                self._step(self._runnable.popleft())
+        finally:
+            self.elapsed += perf_counter() - started
+
+    def _step(self, node):
+        node.scheduled = False
+        computer = node.computer
+        started = perf_counter()
+        outputs = computer.run_until_input(self.budget)
+        node.compute_time += perf_counter() - started
+
+        if outputs:
+            node.empty_reads = 0
+            self._collect(node, outputs)
+
+        if computer.state == HALTED:
+            return
+        if computer.state != NEEDS_INPUT or node.inbox:
+            # Out of budget, or packets arrived while it ran: back of the
+            # queue so every other node gets its turn first.
+            self._schedule(node)
+        elif self.empty_input is not None and node.empty_reads < self.idle_polls:
+            node.empty_reads += 1
+            node.inbox.append(self.empty_input)
+            self._schedule(node)
+
+    def _collect(self, node, outputs):
+        partial = node.partial
+        length = self.packet_size + 1
+        for value in outputs:
+            partial.append(value)
+            if len(partial) == length:
+                node.packets_sent += 1
+                self.send(*partial, source=node.address)
+                partial.clear()
+
+    def _schedule(self, node):
+        if not node.scheduled:
+            node.scheduled = True
+            self._runnable.append(node)
+
+    def stats(self):
+        instructions = sum(node.computer.instruction_count
+                           for node in self.nodes.values())
+        elapsed = self.elapsed or float('inf')
+        return {
+            'elapsed': self.elapsed,
+            'packets': self.packets,
+            'packets_per_second': self.packets / elapsed,
+            'instructions': instructions,
+            'instructions_per_second': instructions / elapsed,
+            'idle_count': self.idle_count,
+            'nodes': {address: node.stats()
+                      for address, node in self.nodes.items()},
+        }
+
+
+if __name__ == '__main__':
+    main()
@@ -19,25 +19,18 @@ def main():
 class HullPaintingRobot():
     def __init__(self, memory):
         self.computer = IntCodeComputer(
-            memory, self.get_input, self.get_output)
+            memory, self.get_input, self.get_output, frame_size=2)
         self.painting = defaultdict(lambda: 0)
         self.current_coordinate = (0, 0)
         self.painting[self.current_coordinate] = 1
         self.current_direction = 'N'
         self.painted_coordinates = set()
-        self.output = []
 
     async def get_input(self):
         return self.painting[self.current_coordinate]
 
-    def get_output(self, value):
-        self.output.append(value)
-
-        if len(self.output) != 2:
-            return
-
-        color = int(self.output.pop(0))
-        direction = int(self.output.pop(0))
+    def get_output(self, frame):
+        color, direction = frame
 
         # Color the current coordinate
         self.painting[self.current_coordinate] = color
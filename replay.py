@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+from collections import Counter, OrderedDict, namedtuple
+from itertools import permutations
+import fileinput
+import hashlib
+
+from intcode import IntCodeComputer, PAGE_SIZE
+
+
+def main():
+    opcodes = fileinput.input().readline().strip().split(',')
+    cache = ReplayCache()
+
+    # Every amplifier in day 7's linear chain runs the same program and
+    # first consumes its phase setting, so most runs resume from a cached
+    # state.
+    best = 0
+    for phase_settings in permutations(range(5)):
+        signal = 0
+        for phase_setting in phase_settings:
+            outputs, _ = cache.run(opcodes, (phase_setting, signal))
+            signal = outputs[-1]
+        best = max(best, signal)
+
+    print(best)
+    print(cache.stats())
+
+
+Entry = namedtuple('Entry', ['snapshot', 'outputs', 'size'])
+
+
+class ReplayCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, **options):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._options = options
+        self._entries = OrderedDict()
+        self._templates = {}
+        # Which input prefix lengths are cached for each program, so a
+        # lookup only probes lengths that can exist.
+        self._lengths = {}
+
+    def run(self, program, inputs):
+        program = [int(value) for value in program]
+        key = program_key(program)
+        inputs = tuple(inputs)
+
+        consumed, entry = self._lookup(key, inputs)
+        if entry is None:
+            self.misses += 1
+            computer = self._template(key, program).fork()
+            outputs = computer.run_until_input()
+            self._store(key, (), computer, outputs)
+        else:
+            self.hits += 1
+            computer = self._template(key, program).fork()
+            computer.restore(entry.snapshot)
+            outputs = list(entry.outputs)
+
+        for index in range(consumed, len(inputs)):
+            computer.feed(inputs[index])
+            outputs.extend(computer.run_until_input())
+            self._store(key, inputs[:index + 1], computer, outputs)
+
+        return outputs, computer
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self._templates.clear()
+        self._lengths.clear()
+        self.size = 0
+
+    def _lookup(self, key, inputs):
+        lengths = self._lengths.get(key, ())
+        for length in sorted((length for length in lengths
+                              if length <= len(inputs)), reverse=True):
+            entry = self._entries.get((key, inputs[:length]))
+            if entry is not None:
+                self._entries.move_to_end((key, inputs[:length]))
+                return length, entry
+        return 0, None
+
+    def _template(self, key, program):
+        if key not in self._templates:
+            self._templates[key] = IntCodeComputer(program, **self._options)
+        return self._templates[key]
+
+    def _store(self, key, inputs, computer, outputs):
+        snapshot = computer.snapshot()
+        stats = snapshot.memory.stats()
+        # Pages are shared copy-on-write between snapshots, so this is an
+        # upper bound on what the entry really holds on to.
+        size = ((stats['image_pages'] + stats['touched_pages']) * PAGE_SIZE
+                + len(outputs) + len(inputs)) * 8
+        if size > self.max_bytes:
+            return
+
+        entry_key = key, inputs
+        if entry_key in self._entries:
+            self._remove(entry_key)
+        self._entries[entry_key] = Entry(snapshot, tuple(outputs), size)
+        self._lengths.setdefault(key, Counter())[len(inputs)] += 1
+        self.size += size
+
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key)
+        self.size -= entry.size
+        key, inputs = entry_key
+        lengths = self._lengths[key]
+        lengths[len(inputs)] -= 1
+        if not lengths[len(inputs)]:
+            del lengths[len(inputs)]
+
+
+def program_key(program):
+    return hashlib.blake2b(','.join(map(str, program)).encode()).hexdigest()
+
+
+if __name__ == '__main__':
+    main()
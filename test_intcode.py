@@ -0,0 +1,33 @@
+from intcode import IntCodeComputer
+
+ECHO = [3, 9, 4, 9, 1105, 1, 0, 99, 0, 0]
+
+
+def test_fork_branches_iterable_input():
+    computer = IntCodeComputer(ECHO, iter(range(10)))
+    assert computer.run_until_output() == 0
+
+    fork = computer.fork()
+    assert [computer.run_until_output() for _ in range(3)] == [1, 2, 3]
+    assert [fork.run_until_output() for _ in range(3)] == [1, 2, 3]
+
+
+def test_fork_keeps_its_own_partial_frame():
+    frames = []
+    forks = []
+
+    def read():
+        # Fork halfway through the first frame.
+        forks.append(computer.fork(inp=[0]))
+        return 0
+
+    # run_sync() starts over from position 0, so a flag at address 20 makes
+    # a rerun skip straight to the input.
+    program = [1005, 20, 9, 104, 1, 1101, 1, 0, 20, 3, 21,
+               104, 2, 104, 3, 104, 4, 99, 0, 0, 0, 0]
+    computer = IntCodeComputer(program, read, frames.append, frame_size=2)
+    computer.run_sync()
+    assert frames == [(1, 2), (3, 4)]
+
+    forks[0].run_sync()
+    assert frames == [(1, 2), (3, 4), (1, 2), (3, 4)]